@@ -0,0 +1,442 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# 无界面运行（必须在导入 PyQt6 之前设置）
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QImage
+
+import desktop_lyrics
+from desktop_lyrics import (DesktopLyricWindow, KaraokeLyricWidget, LayoutPrecomputer, LyricCache, LyricFrameRenderer,
+                            LyricModel, MessageDecoder, field_of, msgspec, orjson)
+
+# ================= 配置区域 =================
+LOG_FILE = "ws_received_data.txt"
+# 与基线相比，吞吐量下降或 p50 延迟上升超过该比例即视为退化
+THRESHOLD = 0.25
+# 逐行查找时的步长（模拟原先 50ms 定时器）
+STEP_MS = 50
+# 稳态逐帧刷新零分配检查的刷新次数
+TICK_CHECK_COUNT = 20000
+# ===========================================
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, int(round(p / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[k]
+
+
+def measure(op, count, warmup, alloc_count=None):
+    """
+    运行一个用例：先预热，再逐次计时，最后在 tracemalloc 下单独跑一轮统计内存
+
+    - retained_bytes: 这一轮结束后 desktop_lyrics 中新增且仍未释放的内存（稳态应为 0）
+    - peak_bytes: 这一轮中相对开始时的内存峰值
+    """
+    for i in range(warmup):
+        op(i)
+
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        total_start = time.perf_counter_ns()
+        for i in range(count):
+            start = time.perf_counter_ns()
+            op(warmup + i)
+            samples.append(time.perf_counter_ns() - start)
+        total = time.perf_counter_ns() - total_start
+    finally:
+        gc.enable()
+
+    # 内存统计单独跑，避免 tracemalloc 的开销影响计时
+    alloc_count = alloc_count or count
+    module_filter = [tracemalloc.Filter(True, desktop_lyrics.__file__)]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        # 先跑几次，让上一次调用留下的临时对象也处于追踪之下
+        for i in range(10):
+            op(warmup + count + i)
+        before = tracemalloc.take_snapshot().filter_traces(module_filter)
+        base, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for i in range(alloc_count):
+            op(warmup + count + 10 + i)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot().filter_traces(module_filter)
+    finally:
+        tracemalloc.stop()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    samples.sort()
+    return {
+        "count": count,
+        "ops_per_sec": round(count * 1e9 / total, 1) if total else 0.0,
+        "mean_us": round(total / count / 1000.0, 2),
+        "p50_us": round(percentile(samples, 50) / 1000.0, 2),
+        "p99_us": round(percentile(samples, 99) / 1000.0, 2),
+        "retained_bytes": retained,
+        "peak_bytes": max(0, peak - base),
+    }
+
+
+def load_lyric_message(path=LOG_FILE):
+    """取录制日志中最后一条 lyric-change 原始消息"""
+    with open(path, "r", encoding="utf-8") as f:
+        raws = re.findall(r"【内容】: (.*)", f.read())
+    lyrics = [raw for raw in raws if raw.startswith('{"type":"lyric-change"')]
+    if not lyrics:
+        raise SystemExit(f"!! 日志中没有 lyric-change 消息: {path}")
+    return lyrics[-1]
+
+
+def synthetic_lyric_message(line_count=600, words_per_line=10):
+    """生成一条大体量的 lyric-change 消息（逐字 + 普通 + 翻译 + 背景歌词）"""
+    yrc, lrc = [], []
+    t = 1000
+    for i in range(line_count):
+        words = []
+        start = t
+        for j in range(words_per_line):
+            words.append({"word": f"词{i % 97}{j} ", "startTime": t, "endTime": t + 230, "romanWord": ""})
+            t += 250
+        words.append({"word": " ", "startTime": 0, "endTime": 0, "romanWord": ""})
+        line = {
+            "words": words, "startTime": start, "endTime": t, "translatedLyric": f"translation line {i}",
+            "romanLyric": "", "isBG": i % 7 == 6, "isDuet": i % 11 == 10,
+        }
+        yrc.append(line)
+        lrc.append(dict(line, words=[{"word": "".join(w["word"] for w in words), "startTime": start, "endTime": t, "romanWord": ""}]))
+        t += 400
+    return json.dumps({"type": "lyric-change", "data": {"lrcData": lrc, "yrcData": yrc, "timestamp": 1700000000000}},
+                      ensure_ascii=False, separators=(",", ":"))
+
+
+def decoder_backends():
+    backends = ["json"]
+    if orjson is not None:
+        backends.append("orjson")
+    if msgspec is not None:
+        backends.append("msgspec")
+    return backends
+
+
+def model_summary(model):
+    """歌词模型（及另一种模式）的全部内容，用于比较不同解码后端的结果"""
+    def lines(m):
+        return [(l.start, l.end, l.original, l.trans, l.is_bg, l.is_duet, [(w.word, w.start, w.end) for w in l.words])
+                for l in m.lines]
+    other = model.alternate()
+    return model.is_karaoke, lines(model), lines(other) if other is not None else None
+
+
+def loose_lyric_message(raw):
+    """把真实歌词消息改成字段类型不规整的版本：翻译为 null、时间为浮点（SPlayer 偶尔会这样发）"""
+    message = json.loads(raw)
+    for name in ("lrcData", "yrcData"):
+        lines = message["data"][name]
+        if lines:
+            lines[0]["translatedLyric"] = None
+            lines[-1]["startTime"] += 0.5
+            if lines[-1]["words"]:
+                lines[-1]["words"][0]["startTime"] += 0.5
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+# 各类型消息的快速路径与回退路径样本：正常格式、键顺序不同、浮点/null/类型不符的字段、未知类型
+SAMPLE_MESSAGES = (
+    '{"type":"progress-change","data":{"currentTime":1234,"duration":200000,"timestamp":1700000000000}}',
+    '{"type":"progress-change","data":{"currentTime":1234.25,"duration":200000.5,"timestamp":1700000000000.5}}',
+    '{"type":"progress-change","data":{"duration":200000,"currentTime":1234,"timestamp":1700000000000}}',
+    '{"type":"progress-change","data":{"currentTime":null,"duration":200000,"timestamp":1700000000000}}',
+    '{"type":"song-change","data":{"title":"歌名","name":"歌名","artist":"歌手","album":"专辑","duration":200000,"timestamp":1}}',
+    '{"type":"song-change","data":{"title":"歌名","name":"歌名","artist":null,"album":"专辑","duration":200000,"timestamp":1}}',
+    '{"type":"status-change","data":{"status":false,"timestamp":1}}',
+    '{"type":"status-change","data":{"status":"paused","timestamp":1}}',
+    '{"type":"unknown","data":{"value":1}}',
+)
+SAMPLE_FIELDS = ("currentTime", "duration", "timestamp", "title", "name", "artist", "album", "status", "value")
+
+
+def check_decoders(real_raw):
+    """断言所有解码后端对同一条消息（含不规整字段）得到相同的结果，不满足时抛出 AssertionError"""
+    backends = decoder_backends()
+    for raw in SAMPLE_MESSAGES:
+        results = {}
+        for backend in backends:
+            msg_type, data = MessageDecoder(backend).decode(raw)
+            results[backend] = (msg_type, {name: field_of(data, name) for name in SAMPLE_FIELDS if field_of(data, name) is not None})
+        # 数值按值比较（msgspec 结构体中的整数字段为 float）
+        assert all(result == results[backends[0]] for result in results.values()), f"解码结果不一致: {raw}\n{results}"
+    for label, raw in (("real", real_raw), ("loose", loose_lyric_message(real_raw))):
+        expected = None
+        for backend in decoder_backends():
+            msg_type, data = MessageDecoder(backend).decode(raw)
+            summary = model_summary(LyricModel.from_payload(data))
+            assert msg_type == "lyric-change", f"{label}/{backend}: 消息类型 {msg_type}"
+            assert summary[1], f"{label}/{backend}: 没有解析出歌词"
+            if expected is None:
+                expected = summary
+            assert summary == expected, f"{label}/{backend}: 歌词模型与 {backends[0]} 后端不一致"
+    print(f">> 解码后端一致: {', '.join(backends)}", file=sys.stderr)
+
+
+def build_cases(win, real_raw, cache_dir, quick=False):
+    """返回 [(用例名, op, 次数, 预热次数), ...]；cache_dir 为持久化排版用例的临时缓存目录"""
+    scale = 0.2 if quick else 1.0
+
+    def n(value):
+        return max(5, int(value * scale))
+
+    cases = []
+    synthetic_raw = synthetic_lyric_message()
+
+    # 1. 解码 + 整理 + 交给窗口
+    for backend in decoder_backends():
+        decoder = MessageDecoder(backend)
+        for label, raw, count in (("real", real_raw, 200), ("synthetic", synthetic_raw, 20)):
+            def parse(i, decoder=decoder, raw=raw):
+                _, data = decoder.decode(raw)
+                win.handle_lyrics_update(LyricModel.from_payload(data))
+            cases.append((f"parse_{label}_{backend}", parse, n(count), 2))
+
+    # 2. 整首歌按 50ms 步长逐次查找当前行
+    model = LyricModel.from_payload(MessageDecoder().decode(real_raw)[1])
+    song_end = model.lines[-1].end + 2000 if model.lines else 60000
+    steps = song_end // STEP_MS
+
+    def lookup(i):
+        if i % steps == 0:
+            win.handle_lyrics_update(model)
+        win._update_current_line((i % steps) * STEP_MS)
+    cases.append(("lookup_song_50ms", lookup, n(steps * 3), steps))
+
+    # 3. 同一行内的逐帧刷新（稳态不应产生任何新的 Python 对象，见 check_tick_allocations）
+    times = steady_tick_times(model, 20000)
+
+    def tick(i):
+        win._update_current_line(times[i % len(times)])
+    cases.append(("tick_steady", tick, n(20000), 200))
+
+    # 4. 后台整首歌预排版（测量 / 从持久化数据读取）
+    precomputer = LayoutPrecomputer()
+    specs = win.lyric_widget.layout_specs()
+    family = win.lyric_widget.font_family
+    cases.append(("precompute_measure", lambda i: precomputer.compute(model, family, specs), n(50), 2))
+    cache = LyricCache(cache_dir, 1 << 24)
+    stored = LyricModel(model.lines, model.is_karaoke)
+    stored.digest = b"bench-layout-key"
+    cases.append(("precompute_persisted", lambda i: precomputer.compute(stored, family, specs, cache), n(200), 2))
+
+    # 5. 绘制到 QImage：逐字 / 普通 / 切换动画中；direct 为逐次直接绘制，backbuffer 为后备缓冲
+    widget = KaraokeLyricWidget()
+    widget.resize(1200, 80)
+    image = QImage(widget.size(), QImage.Format.Format_ARGB32_Premultiplied)
+    plain_model = model.alternate() or model
+    karaoke_line = steady_line(model)
+    plain_line = next((l for l in plain_model.lines if not l.is_bg), plain_model.lines[0])
+    duration = max(1, karaoke_line.end - karaoke_line.start)
+
+    def paint_setup(lines, is_karaoke, transition=False, pixmaps=True, backbuffer=False):
+        widget.use_line_pixmaps = pixmaps
+        widget.use_backbuffer = backbuffer
+        widget.set_multi_lines((plain_line,), False, animate=False)
+        widget.set_multi_lines(lines, is_karaoke, animate=transition)
+        widget.anim.stop()
+        widget._anim_progress = 0.5 if transition else 1.0
+
+    def make_paint(lines, is_karaoke, transition=False, pixmaps=True, backbuffer=False, advance=True):
+        def paint(i):
+            if i == 0:
+                paint_setup(lines, is_karaoke, transition, pixmaps, backbuffer)
+            if advance or i == 0:
+                widget.set_time(lines[0].start + (i * 16) % duration)
+            image.fill(0)
+            widget.render(image)
+        return paint
+
+    cases.append(("paint_karaoke", make_paint((karaoke_line,), True), n(1000), 20))
+    cases.append(("paint_karaoke_direct", make_paint((karaoke_line,), True, pixmaps=False), n(1000), 20))
+    cases.append(("paint_plain", make_paint((plain_line,), False), n(1000), 20))
+    cases.append(("paint_transition", make_paint((karaoke_line,), True, transition=True), n(1000), 20))
+    # 内容不变的重绘（窗口被遮挡后重新露出、置顶重绘等）
+    cases.append(("paint_expose", make_paint((karaoke_line,), True, advance=False), n(1000), 20))
+    cases.append(("paint_karaoke_backbuffer", make_paint((karaoke_line,), True, backbuffer=True), n(1000), 20))
+    cases.append(("paint_plain_backbuffer", make_paint((plain_line,), False, backbuffer=True), n(1000), 20))
+    cases.append(("paint_transition_backbuffer", make_paint((karaoke_line,), True, transition=True, backbuffer=True), n(1000), 20))
+    cases.append(("paint_expose_backbuffer", make_paint((karaoke_line,), True, backbuffer=True, advance=False), n(1000), 20))
+
+    # 6. 无界面批量渲染：整首歌按 30fps 逐帧画到复用的 QImage（每次操作一帧）
+    renderer = LyricFrameRenderer(model)
+    frame_step = 1000.0 / 30
+
+    def render_batch(i):
+        renderer.render(int((i * frame_step) % song_end))
+    cases.append(("render_batch_30fps", render_batch, n(2000), 20))
+    return cases
+
+
+def steady_line(model):
+    """逐帧刷新用例使用的行：第一句较长的主歌词"""
+    return next((l for l in model.lines if not l.is_bg and l.end - l.start > 1000), model.lines[0])
+
+
+def steady_tick_times(model, count):
+    """同一行内逐帧刷新的时间序列（预先算好，检查内存时不把基准自身的整数运算算进去）"""
+    line = steady_line(model)
+    span = max(1, line.end - line.start - 20)
+    return [line.start + 10 + (i // 10) % span for i in range(count)]
+
+
+def _count_blocks(update, times):
+    """跑一遍 times，返回前后 sys.getallocatedblocks() 之差"""
+    blocks = sys.getallocatedblocks()
+    for t in times:
+        update(t)
+    return sys.getallocatedblocks() - blocks
+
+
+def check_tick_allocations(win, model, count=TICK_CHECK_COUNT):
+    """
+    断言同一行内的逐帧刷新没有净分配，不满足时抛出 AssertionError
+
+    - 唯一的预热余量：先完整跑一遍同样的刷新，让排版缓存和解释器的空闲列表（float、tuple 等）就位
+    - 再跑 count 次，内存块数的变化必须与空循环完全相同
+    - tracemalloc 下再跑一遍：desktop_lyrics 中留存的内存必须为 0（峰值只是单次调用的临时对象，仅输出）
+    """
+    win.handle_lyrics_update(model)
+    times = steady_tick_times(model, count)
+    update = win._update_current_line
+    module_filter = [tracemalloc.Filter(True, desktop_lyrics.__file__)]
+    gc.collect()  # 会清空空闲列表，只在预热之前调用
+    gc.disable()
+    try:
+        _count_blocks(update, times)
+        growth = _count_blocks(update, times) - _count_blocks(update, ())
+        tracemalloc.start()
+        try:
+            _count_blocks(update, times)
+            before = tracemalloc.take_snapshot().filter_traces(module_filter)
+            base, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _count_blocks(update, times)
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot().filter_traces(module_filter)
+        finally:
+            tracemalloc.stop()
+    finally:
+        gc.enable()
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    print(f">> tick_check               {count} 次刷新：内存块 {growth:+d}，留存 {retained}B，峰值 {peak - base}B",
+          file=sys.stderr)
+    assert growth == 0, f"稳态逐帧刷新 {count} 次后多出 {growth} 个内存块"
+    assert retained == 0, f"稳态逐帧刷新 {count} 次后 desktop_lyrics 中留存 {retained}B"
+
+
+def compare(results, baseline, threshold):
+    """与基线比较，返回退化说明列表"""
+    regressions = []
+    base_cases = baseline.get("cases", {})
+    for name, result in results["cases"].items():
+        base = base_cases.get(name)
+        if not base:
+            continue
+        if result["ops_per_sec"] < base["ops_per_sec"] / (1 + threshold):
+            regressions.append(f"{name}: ops/s {base['ops_per_sec']} -> {result['ops_per_sec']}")
+        if result["p50_us"] > base["p50_us"] * (1 + threshold):
+            regressions.append(f"{name}: p50 {base['p50_us']}us -> {result['p50_us']}us")
+        # 解析类用例会留住窗口持有的最新歌词，只检查基线中本来不留内存的用例
+        if base["retained_bytes"] <= 0 < result["retained_bytes"]:
+            regressions.append(f"{name}: retained {base['retained_bytes']}B -> {result['retained_bytes']}B")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="桌面歌词热点路径基准测试（无界面）")
+    parser.add_argument("--log", default=LOG_FILE, help="取真实歌词消息的录制日志")
+    parser.add_argument("--out", help="结果 JSON 输出路径（默认输出到标准输出）")
+    parser.add_argument("--baseline", help="与该基线 JSON 比较，退化时以非零状态退出")
+    parser.add_argument("--save-baseline", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="允许的退化比例")
+    parser.add_argument("--only", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--quick", action="store_true", help="减少迭代次数，快速检查")
+    parser.add_argument("--check-decoders", action="store_true", help="只检查各解码后端结果一致（不通过时非零状态退出）")
+    parser.add_argument("--check-ticks", action="store_true", help="只检查稳态逐帧刷新零分配（不通过时非零状态退出）")
+    args = parser.parse_args(argv)
+
+    if args.check_decoders:
+        check_decoders(load_lyric_message(args.log))
+        return 0
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    win = DesktopLyricWindow()
+    # 基准测试不需要连接播放器
+    win.worker.stop()
+    win.worker.signal_lyric_data.disconnect()
+    win.worker.signal_progress_ready.disconnect()
+    # 后台预排版单独测量（见 precompute_* 用例），不与界面线程用例争抢
+    win.config["precompute_layouts"] = False
+
+    raw = load_lyric_message(args.log)
+    if args.check_ticks:
+        check_tick_allocations(win, LyricModel.from_payload(MessageDecoder().decode(raw)[1]))
+        app.quit()
+        return 0
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "decoder": MessageDecoder().backend,
+        "cases": {},
+    }
+    # 用例跑完即删除临时缓存目录
+    with tempfile.TemporaryDirectory(prefix="bench_lyrics_") as cache_dir:
+        for name, op, count, warmup in build_cases(win, raw, cache_dir, args.quick):
+            if args.only and args.only not in name:
+                continue
+            results["cases"][name] = measure(op, count, warmup)
+            r = results["cases"][name]
+            print(f">> {name:<24} {r['ops_per_sec']:>12.1f} ops/s  p50 {r['p50_us']:>9.2f}us  "
+                  f"p99 {r['p99_us']:>9.2f}us  retained {r['retained_bytes']}B", file=sys.stderr)
+
+    failed = False
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        results["regressions"] = regressions
+        for line in regressions:
+            print(f"!! 退化: {line}", file=sys.stderr)
+        failed = failed or bool(regressions)
+
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    # 跑了稳态刷新用例时再做零分配检查，失败时直接抛出 AssertionError（非零状态退出）
+    if "tick_steady" in results["cases"]:
+        check_tick_allocations(win, LyricModel.from_payload(MessageDecoder().decode(raw)[1]))
+
+    app.quit()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,92 +1,91 @@
-import websocket
+import argparse
 import json
-import threading
-import time
 import os
+import sys
+import time
+
+import websocket
+
+from desktop_lyrics import CaptureLogger
 
 # ================= 配置区域 =================
 # 1. 填入你的 WebSocket 地址
-WS_URL = "ws://127.0.0.1:25885" 
+WS_URL = "ws://127.0.0.1:25885"
+
+# 2. 本地录制文件名（NDJSON；.gz / .zst 结尾则压缩），可直接交给 replay_ws.py 回放
+LOG_FILE = "ws_capture.ndjson.gz"
 
-# 2. 本地日志文件名
-LOG_FILE = "ws_received_data.txt"
+# 3. 单个文件大小上限（MB，未压缩）与保留的旧文件数
+MAX_MB = 64
+BACKUPS = 5
 # ===========================================
 
-def save_to_file(raw_data):
-    """
-    将原始数据追加写入到本地文件
-    """
-    try:
-        current_time = time.strftime("%Y-%m-%d %H:%M:%S")
-        # 分隔符，方便阅读
-        separator = "-" * 50
-        
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"【时间】: {current_time}\n")
-            f.write(f"【内容】: {raw_data}\n")
-            f.write(f"{separator}\n")
-    except Exception as e:
-        print(f"!! 写入文件失败: {e}")
+capture = None
+pretty = False
+started = time.monotonic()
+
 
 def on_message(ws, message):
     """
-    当收到服务器发来的消息时触发
+    当收到服务器发来的消息时触发：交给后台线程写盘，控制台只打印一行摘要
     """
-    # ----------------------------------------
-    # 1. 控制台输出 (屏幕显示)
-    # ----------------------------------------
-    print("\n" + "=" * 50)
-    print("【收到新数据】")
-    
-    # 尝试解析 JSON 以便在屏幕上漂亮地打印
-    try:
-        data = json.loads(message)
-        # ensure_ascii=False 保证中文正常显示
-        pretty_json = json.dumps(data, indent=4, ensure_ascii=False)
-        print(pretty_json)
-    except:
-        # 如果不是JSON，直接打印原始字符串
-        print(message)
-    
-    print("=" * 50)
-
-    # ----------------------------------------
-    # 2. 写入本地文件
-    # ----------------------------------------
-    save_to_file(message)
-    print(f">> 数据已保存至 {LOG_FILE}")
+    capture.put(message)
+    if pretty:
+        # 尝试解析 JSON 以便在屏幕上漂亮地打印（大段歌词时很慢，仅调试用）
+        try:
+            print(json.dumps(json.loads(message), indent=4, ensure_ascii=False))
+        except ValueError:
+            print(message)
+    else:
+        head = message[:48]
+        msg_type = head[9:head.find('"', 9)] if head.startswith('{"type":"') else "?"
+        print(f"[{time.monotonic() - started:9.3f}s] {msg_type:<16} {len(message):>8} 字节")
+
 
 def on_error(ws, error):
     print(f"【错误】: {error}")
 
+
 def on_close(ws, close_status_code, close_msg):
     print("【连接已关闭】")
     print(f"状态码: {close_status_code}, 信息: {close_msg}")
 
+
 def on_open(ws):
     print("【连接成功】")
     print(f"正在监听: {WS_URL}")
-    print(f"数据将同时保存到: {os.path.abspath(LOG_FILE)}")
+    print(f"数据将同时保存到: {os.path.abspath(capture.path)}")
+
+
+def main(argv=None):
+    global capture, pretty
+    parser = argparse.ArgumentParser(description="录制 SPlayer WebSocket 原始消息（可用 replay_ws.py --log 回放）")
+    parser.add_argument("--out", default=LOG_FILE, help="录制文件路径")
+    parser.add_argument("--max-mb", type=float, default=MAX_MB, help="单个文件大小上限 (MB，未压缩)，超出后轮转")
+    parser.add_argument("--backups", type=int, default=BACKUPS, help="保留的旧录制文件数")
+    parser.add_argument("--pretty", action="store_true", help="在控制台完整打印每条消息（慢）")
+    args = parser.parse_args(argv)
+    pretty = args.pretty
 
-if __name__ == "__main__":
     websocket.enableTrace(False)
-    
-    if "你的端口" in WS_URL:
-        print("❌ 错误：请先修改脚本中的 WS_URL 变量！")
-    else:
-        # 如果文件存在，先在开始时加个标记，区分不同次的运行
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write("\n\n====== 新的运行会话开始 ======\n\n")
-
-        ws = websocket.WebSocketApp(
-            WS_URL,
-            on_open=on_open,
-            on_message=on_message,
-            on_error=on_error,
-            on_close=on_close
-        )
+    capture = CaptureLogger(args.out, int(args.max_mb * 1024 * 1024), args.backups, WS_URL)
 
-        try:
-            ws.run_forever(ping_interval=60)
-        except KeyboardInterrupt:
-            print("\n用户手动停止")
\ No newline at end of file
+    ws = websocket.WebSocketApp(
+        WS_URL,
+        on_open=on_open,
+        on_message=on_message,
+        on_error=on_error,
+        on_close=on_close
+    )
+
+    try:
+        ws.run_forever(ping_interval=60)
+    except KeyboardInterrupt:
+        print("\n用户手动停止")
+    finally:
+        capture.close()
+        print(f">> 录制 {capture.written} 条消息，丢弃 {capture.dropped} 条，轮转 {capture.rotations} 次")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
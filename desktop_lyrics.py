@@ -1,11 +1,53 @@
+import time
+
+# 启动各阶段 (名称, perf_counter 时刻, 耗时或 None)，--startup-profile 时打印
+STARTUP_MARKS = []
+
+
+def startup_mark(name, since=None):
+    """记录一个启动阶段；since 为该阶段开始的 perf_counter 时刻，返回当前时刻"""
+    now = time.perf_counter()
+    STARTUP_MARKS.append((name, now, None if since is None else now - since))
+    return now
+
+
+_t = startup_mark("开始导入")
+
 import sys
 import json
-import websocket
 import os
-from PyQt6.QtGui import QPainter, QFont, QColor, QLinearGradient, QFontMetrics, QAction, QIcon
+import re
+import random
+import threading
+import queue
+import bisect
+import heapq
+import hashlib
+import mmap
+import struct
+from array import array
+from collections import deque
+from itertools import islice
+_t = startup_mark("导入标准库", _t)
+from PyQt6.QtGui import QPainter, QFont, QColor, QLinearGradient, QFontMetrics, QFontInfo, QAction, QIcon, QPixmap, QImage
 from PyQt6.QtWidgets import QApplication, QLabel, QWidget, QHBoxLayout, QGraphicsOpacityEffect, QSystemTrayIcon, QMenu, QStyle
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QRect, QTimer, QPropertyAnimation, QEasingCurve, QPoint, pyqtProperty
+from PyQt6.QtCore import Qt, QObject, QEvent, QThread, pyqtSignal, QRect, QRectF, QTimer, QPropertyAnimation, QEasingCurve, QPoint, pyqtProperty, QT_VERSION_STR
 import ctypes
+_t = startup_mark("导入 PyQt6", _t)
+# websocket-client 只在工作线程中使用，到线程里再导入（约占模块导入时间的三成），不推迟窗口显示
+
+# 可选的高速 JSON 解析库（未安装时回退到标准库 json）
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+# msgspec 结构体字段类型不符时抛出的异常（未安装 msgspec 时用一个不会被抛出的占位类型）
+ValidationError = msgspec.ValidationError if msgspec is not None else type("ValidationError", (ValueError,), {})
+try:
+    import orjson
+except ImportError:
+    orjson = None
+_t = startup_mark("导入 msgspec/orjson", _t)
 
 # ================= 配置区域 =================
 WS_URL = "ws://127.0.0.1:25885" 
@@ -17,65 +59,1131 @@ DEFAULT_CONFIG = {
     "main_size_no_bg": 24,
     "main_size_with_bg": 17,
     "font_family": "Microsoft YaHei UI",
-    "window_width": 1200
+    "window_width": 1200,
+    "overflow_mode": "scroll",  # 超出宽度的歌词: scroll=跟随演唱滚动, fit=缩小字号(仍放不下再滚动), none=不处理
+    "use_line_pixmaps": True,  # 逐行预渲染位图绘制（False 则逐字直接绘制，便于对比）
+    "use_backbuffer": False,  # 先画到可复用的 QImage 后备缓冲，内容不变的重绘只贴图（见 bench_lyrics.py 的 paint_*_backbuffer）
+    "prefer_karaoke": True,  # 有逐字歌词时优先显示逐字歌词
+    "perf_overlay": False,  # 显示性能统计浮层（Alt+P 切换）
+    "perf_dump": "lyric_perf",  # 启用性能统计时，退出时导出 <路径>.json / <路径>.csv
+    "sync_log": "",  # 时钟校准事件日志 (CSV) 路径，留空则不记录
+    "capture_path": "",  # 录制收到的原始消息（NDJSON，.gz/.zst 结尾则压缩），可用 replay_ws.py 回放；留空则不录制
+    "capture_max_mb": 64,  # 单个录制文件的大小上限（未压缩），超出后轮转
+    "capture_backups": 5,  # 轮转时保留的旧录制文件数
+    "lyric_cache_dir": "lyric_cache",  # 本地歌词缓存目录（留空则不缓存）
+    "lyric_cache_max_mb": 32,  # 歌词缓存总大小上限，超出后淘汰最久未使用的歌曲
+    "precompute_layouts": True,  # 收到歌词后在后台为整首歌预排版
+    "persist_layout_metrics": True  # 把整首歌的排版测量结果保存到歌词缓存目录
 } 
 # ===========================================
 
+class LyricWord:
+    """单个字/词（只读）"""
+    __slots__ = ("word", "start", "end")
+
+    def __init__(self, word, start, end):
+        self.word = word
+        self.start = start
+        self.end = end
+
+
+class LyricLine:
+    """一行歌词（只读），original 为预先拼接好的原文"""
+    __slots__ = ("start", "end", "original", "trans", "is_bg", "is_duet", "words")
+
+    def __init__(self, start, end, original, trans="", is_bg=False, is_duet=False, words=()):
+        self.start = start
+        self.end = end
+        self.original = original
+        self.trans = trans
+        self.is_bg = is_bg  # 是否为背景歌词
+        self.is_duet = is_duet  # 是否为对唱
+        self.words = words  # tuple[LyricWord]，普通模式下为整行一个"字"
+
+    @classmethod
+    def plain(cls, text):
+        """构造一行无时间信息的普通文本"""
+        return cls(0, 0, text, words=(LyricWord(text, 0, 0),))
+
+
+class LyricPayload:
+    """lyric-change 消息中 lrcData / yrcData 两个分支的原始 JSON，只在需要时才解码其中一个"""
+    __slots__ = ("_raw", "_empty", "_loads", "_span_loads", "_generic_loads")
+
+    def __init__(self, lrc_raw, yrc_raw, loads, span_loads=None, generic_loads=json.loads):
+        # 分支为 str/bytes，或 (整条消息, 起点, 终点) 区间（解码前不复制文本）
+        self._raw = {"lrcData": lrc_raw, "yrcData": yrc_raw}
+        self._empty = {name: self._is_empty_array(raw) for name, raw in self._raw.items()}
+        self._loads = loads  # 原始 JSON -> 歌词行列表
+        self._span_loads = span_loads  # (文本, 起点, 终点) -> 歌词行列表，不支持时先切片再 loads
+        self._generic_loads = generic_loads  # loads 报字段类型不符时改用的通用解码（-> dict 列表）
+
+    @staticmethod
+    def _is_empty_array(raw):
+        if isinstance(raw, tuple):
+            text, start, end = raw
+            if end - start > 16:
+                return False
+            raw = text[start:end]
+        if len(raw) > 16:
+            return False
+        text = raw if isinstance(raw, str) else bytes(raw).decode("utf-8")
+        return text.strip() in ("", "[]", "null")
+
+    def is_empty(self, name):
+        return self._empty[name]
+
+    def branch(self, name):
+        """解码一个分支并释放其原始 JSON"""
+        raw = self._raw.pop(name, None)
+        # 剩下的分支切成独立文本，不再引用整条消息
+        for other, other_raw in self._raw.items():
+            if isinstance(other_raw, tuple):
+                text, start, end = other_raw
+                self._raw[other] = text[start:end]
+        if raw is None or self._empty[name]:
+            return []
+        try:
+            try:
+                lines = self._decode(raw)
+            except ValidationError:
+                # msgspec 结构体字段类型不符（如翻译为 null、时间为浮点）：通用解码为 dict，与 json/orjson 后端结果一致
+                if isinstance(raw, tuple):
+                    text, start, end = raw
+                    raw = text[start:end]
+                lines = self._generic_loads(raw if isinstance(raw, (str, bytes)) else bytes(raw))
+        except Exception as e:
+            print(f"解析错误: {e}")
+            return []
+        return lines if isinstance(lines, list) else []
+
+    def _decode(self, raw):
+        if not isinstance(raw, tuple):
+            return self._loads(raw)
+        if self._span_loads is not None:
+            try:
+                return self._span_loads(*raw)
+            except ValueError:
+                pass  # 区间与 JSON 边界不符：切片后整体解码（消息格式有误时下面会再报错）
+        text, start, end = raw
+        return self._loads(text[start:end])
+
+
+class LyricModel:
+    """一首歌解析完成的歌词（只读），在 WebSocket 线程中构建后整体交给界面线程"""
+    __slots__ = ("lines", "is_karaoke", "timeline", "digest", "_payload", "_alternate")
+    _alternate_lock = threading.Lock()  # 界面线程（切换模式）和缓存写入线程都可能首次解码另一种模式
+
+    def __init__(self, lines, is_karaoke, payload=None):
+        self.lines = lines  # tuple[LyricLine]
+        self.is_karaoke = is_karaoke  # 是否为逐字模式
+        self.timeline = LyricTimeline(lines)  # 预计算时间轴索引
+        self.digest = None  # 歌词内容摘要（启用本地缓存时设置），用于持久化排版数据
+        self._payload = payload  # 原始消息，另一种模式的歌词在需要时从这里解码
+        self._alternate = None
+
+    @classmethod
+    def from_payload(cls, data, prefer_karaoke=True):
+        """解析 lyric-change 消息：默认优先 yrcData（逐字），否则 lrcData；LyricPayload 只解码选中的分支"""
+        if isinstance(data, LyricPayload):
+            has_yrc = not data.is_empty("yrcData")
+            is_karaoke = has_yrc and (prefer_karaoke or data.is_empty("lrcData"))
+            raw_lines = data.branch("yrcData" if is_karaoke else "lrcData")
+        else:
+            yrc_data = field_of(data, "yrcData", []) or []
+            lrc_data = field_of(data, "lrcData", []) or []
+            is_karaoke = bool(yrc_data) and (prefer_karaoke or not lrc_data)
+            raw_lines = yrc_data if is_karaoke else lrc_data
+            # 只保留未使用的分支，供切换模式时使用
+            data = {"lrcData": lrc_data} if is_karaoke else {"yrcData": yrc_data}
+        return cls(cls._parse_lines(raw_lines, is_karaoke), is_karaoke, data)
+
+    def alternate(self):
+        """另一种模式（逐字 / 普通）的歌词，首次调用时才解码对应分支；没有则返回 None"""
+        if self._alternate is None and self._payload is not None:
+            with self._alternate_lock:
+                if self._payload is not None:
+                    other = LyricModel.from_payload(self._payload, prefer_karaoke=not self.is_karaoke)
+                    if other.is_karaoke != self.is_karaoke:
+                        other.digest = self.digest
+                        other._alternate = self
+                        self._alternate = other
+                    self._payload = None
+        return self._alternate
+
+    @staticmethod
+    def _parse_lines(raw_lines, is_karaoke):
+        """把原始歌词行（dict 或 msgspec 结构体）整理为 LyricLine 元组"""
+        if raw_lines and not isinstance(raw_lines[0], dict):
+            return LyricModel._parse_struct_lines(raw_lines, is_karaoke)
+        lines = []
+        for line in raw_lines:
+            words_list = line.get("words", [])
+            orig = "".join([w.get("word", "") for w in words_list])
+            # 简单清洗
+            if not orig.strip():
+                continue
+            start = line.get("startTime", 0)
+            end = line.get("endTime", 0)
+            if is_karaoke:
+                # 卡拉OK模式：保存逐字信息
+                words = tuple(LyricWord(w.get("word", ""), w.get("startTime", 0), w.get("endTime", 0)) for w in words_list)
+            else:
+                words = (LyricWord(orig, start, end),)
+            lines.append(LyricLine(
+                start, end, orig,
+                line.get("translatedLyric", ""),
+                line.get("isBG", False),
+                line.get("isDuet", False),
+                words
+            ))
+        return tuple(lines)
+
+    @staticmethod
+    def _parse_struct_lines(raw_lines, is_karaoke):
+        """同 _parse_lines，输入为 msgspec 解码出的 RawLine"""
+        lines = []
+        for line in raw_lines:
+            orig = "".join([w.word for w in line.words])
+            if not orig.strip():
+                continue
+            if is_karaoke:
+                words = tuple(LyricWord(w.word, w.startTime, w.endTime) for w in line.words)
+            else:
+                words = (LyricWord(orig, line.startTime, line.endTime),)
+            lines.append(LyricLine(
+                line.startTime, line.endTime, orig,
+                line.translatedLyric, line.isBG, line.isDuet, words
+            ))
+        return tuple(lines)
+
+
+if msgspec is not None:
+    # SPlayer 消息结构（只声明用到的字段，其余字段解码时忽略）
+    class RawWord(msgspec.Struct):
+        word: str = ""
+        startTime: int = 0
+        endTime: int = 0
+
+    class RawLine(msgspec.Struct):
+        words: list[RawWord] = []
+        startTime: int = 0
+        endTime: int = 0
+        translatedLyric: str = ""
+        isBG: bool = False
+        isDuet: bool = False
+
+    class LyricData(msgspec.Struct):
+        # 两个分支先保留为原始 JSON，由 LyricPayload 按需解码
+        lrcData: msgspec.Raw = msgspec.Raw(b"[]")
+        yrcData: msgspec.Raw = msgspec.Raw(b"[]")
+
+    class ProgressData(msgspec.Struct):
+        currentTime: float = 0
+        duration: float = 0
+        timestamp: float = 0
+
+    class SongData(msgspec.Struct):
+        title: str = "未知歌曲"
+        name: str = ""
+        artist: str = ""
+        album: str = ""
+        duration: float = 0
+        timestamp: float = 0
+
+    class StatusData(msgspec.Struct):
+        status: bool = True
+        timestamp: float = 0
+
+    class LyricChangeMessage(msgspec.Struct, tag="lyric-change", tag_field="type"):
+        data: LyricData
+
+    class ProgressChangeMessage(msgspec.Struct, tag="progress-change", tag_field="type"):
+        data: ProgressData
+
+    class SongChangeMessage(msgspec.Struct, tag="song-change", tag_field="type"):
+        data: SongData
+
+    class StatusChangeMessage(msgspec.Struct, tag="status-change", tag_field="type"):
+        data: StatusData
+
+
+def field_of(data, name, default=None):
+    """读取消息字段，兼容 dict 与 msgspec 结构体"""
+    if isinstance(data, dict):
+        return data.get(name, default)
+    return getattr(data, name, default)
+
+
+class MessageDecoder:
+    """SPlayer 消息解码器（msgspec > orjson > json）：按消息类型走快速路径，任何快速路径失败都回退到通用解码"""
+    LYRIC_HEAD = '{"type":"lyric-change","data":{"lrcData":'
+    LYRIC_SEP = ',"yrcData":'
+    _LYRIC_TAIL_RE = re.compile(r'(?:,"timestamp":-?\d+(?:\.\d+)?)?\}\}\s*$')
+    TYPE_PREFIX = '{"type":"'
+    _PROGRESS_RE = re.compile(
+        r'\{"type":"progress-change","data":\{"currentTime":(-?\d+(?:\.\d+)?),'
+        r'"duration":(-?\d+(?:\.\d+)?),"timestamp":(-?\d+(?:\.\d+)?)\}\}'
+    )
+
+    def __init__(self, backend=None):
+        if backend is None:
+            backend = "msgspec" if msgspec is not None else "orjson" if orjson is not None else "json"
+        self.backend = backend
+        self._typed = {}  # 消息类型 -> msgspec 专用解码器
+        if backend == "msgspec":
+            self._loads = msgspec.json.decode
+            self._generic_loads = orjson.loads if orjson is not None else json.loads
+            self._load_lines = msgspec.json.Decoder(list[RawLine]).decode
+            for msg_cls in (ProgressChangeMessage, LyricChangeMessage, SongChangeMessage, StatusChangeMessage):
+                self._typed[msg_cls.__struct_config__.tag] = msgspec.json.Decoder(msg_cls)
+        elif backend == "orjson":
+            self._loads = orjson.loads
+            self._load_lines = orjson.loads
+        else:
+            self._loads = json.loads
+            self._load_lines = json.loads
+            self._json_decoder = json.JSONDecoder()
+
+    def decode(self, message):
+        """解码一条消息，返回 (消息类型, 数据)；数据为 dict 或 msgspec 结构体"""
+        if self._typed:
+            if message.startswith(self.TYPE_PREFIX):
+                end = message.find('"', 9, 40)
+                decoder = self._typed.get(message[9:end]) if end > 0 else None
+                if decoder is not None:
+                    try:
+                        msg = decoder.decode(message)
+                        if isinstance(msg, LyricChangeMessage):
+                            # copy() 只保留分支本身，不引用整条消息
+                            return "lyric-change", LyricPayload(msg.data.lrcData.copy(), msg.data.yrcData.copy(),
+                                                                self._load_lines, generic_loads=self._generic_loads)
+                        return msg.__struct_config__.tag, msg.data
+                    except msgspec.ValidationError:
+                        pass  # 字段类型不符，走通用解码
+        elif self.backend == "json":
+            payload = self._split_lyric(message)
+            if payload is not None:
+                return "lyric-change", payload
+            match = self._PROGRESS_RE.fullmatch(message)
+            if match:
+                current, duration, timestamp = match.groups()
+                return "progress-change", {
+                    "currentTime": self._number(current),
+                    "duration": self._number(duration),
+                    "timestamp": self._number(timestamp),
+                }
+        
+        payload = self._loads(message)
+        return payload.get("type"), payload.get("data", {})
+
+    def _split_lyric(self, message):
+        """按 SPlayer 的消息布局切出 lrcData / yrcData 两段原始 JSON；布局不符时返回 None"""
+        if not message.startswith(self.LYRIC_HEAD):
+            return None
+        # 字符串内部的引号一定带转义，所以 ',"yrcData":' 只可能是键
+        sep = message.find(self.LYRIC_SEP, len(self.LYRIC_HEAD))
+        tail = self._LYRIC_TAIL_RE.search(message, max(sep, len(message) - 64))
+        if sep < 0 or tail is None:
+            return None
+        lrc_start = len(self.LYRIC_HEAD)
+        yrc_start = sep + len(self.LYRIC_SEP)
+        end = tail.start()
+        if not (message[lrc_start] == "[" and message[sep - 1] == "]" and message[yrc_start] == "[" and message[end - 1] == "]"):
+            return None
+        return LyricPayload((message, lrc_start, sep), (message, yrc_start, end), self._load_lines, self._raw_decode_span)
+
+    def _raw_decode_span(self, text, start, end):
+        """标准库直接从整条消息的指定位置解码，不复制文本"""
+        value, stop = self._json_decoder.raw_decode(text, start)
+        if stop != end:
+            raise ValueError("歌词分支边界不符")
+        return value
+
+    @staticmethod
+    def _number(text):
+        return float(text) if "." in text else int(text)
+
+
+class LyricCache:
+    """本地歌词缓存：按歌曲身份保存解析完成的歌词模型（紧凑二进制 + mmap 读取，按总大小 LRU 淘汰）"""
+    MAGIC = b"LYC1"
+    VERSION = 2
+    SUFFIX = ".lyc"
+    SUFFIXES = (".lyc", ".lym")
+    HEADER = struct.Struct("<4sHH16sI")  # 魔数, 版本, 模型数, 内容摘要, 字符串区长度
+    MODEL = struct.Struct("<B3xII")  # 是否逐字, 行数, 字数
+    LINE = struct.Struct("<iiB3xIIIII")  # 开始, 结束, 标记(1=背景 2=对唱), 原文偏移/长度, 翻译偏移/长度, 字数
+    WORD = struct.Struct("<iiII")  # 开始, 结束, 文本偏移/长度
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = None  # 文件名 -> [文件大小, 最近使用时间]，首次写入时扫描目录建立
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def song_key(data):
+        """由 song-change 数据计算缓存键；缺少歌名时返回 None"""
+        name = field_of(data, "name", "") or ""
+        if not name:
+            return None
+        ident = "\0".join((name, field_of(data, "artist", "") or "", field_of(data, "album", "") or "",
+                           str(int(field_of(data, "duration", 0) or 0))))
+        return hashlib.blake2b(ident.encode("utf-8"), digest_size=16).hexdigest()
+
+    @staticmethod
+    def payload_digest(message):
+        """原始 lyric-change 消息的内容摘要（去掉末尾的时间戳），收到消息时就能算出，不需要解码另一种模式"""
+        end = message.rfind('"timestamp"')
+        return hashlib.blake2b((message[:end] if end > 0 else message).encode("utf-8"), digest_size=16).digest()
+
+    @classmethod
+    def encode(cls, model, digest):
+        """把歌词模型（连同已解码的另一种模式）编码为缓存文件内容；digest 为原始消息的内容摘要"""
+        models = [model] if model._alternate is None else [model, model._alternate]
+        models.sort(key=lambda m: not m.is_karaoke)  # 逐字在前，保证摘要与当前显示模式无关
+        strings = bytearray()
+
+        def add(text):
+            data = text.encode("utf-8")
+            offset = len(strings)
+            strings.extend(data)
+            return offset, len(data)
+
+        body = bytearray()
+        for m in models:
+            body += cls.MODEL.pack(m.is_karaoke, len(m.lines), sum(len(l.words) for l in m.lines))
+            for line in m.lines:
+                flags = (1 if line.is_bg else 0) | (2 if line.is_duet else 0)
+                # 消息里的时间可能是浮点、翻译可能是 null（通用解码时原样保留）
+                body += cls.LINE.pack(int(line.start), int(line.end), flags, *add(line.original), *add(line.trans or ""),
+                                      len(line.words))
+            for line in m.lines:
+                for w in line.words:
+                    body += cls.WORD.pack(int(w.start), int(w.end), *add(w.word))
+        return cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(models), digest, len(strings)) + body + strings
+
+    @classmethod
+    def decode(cls, buf, prefer_karaoke=True):
+        """解析缓存内容（bytes 或 mmap），返回按偏好选出的 LyricModel；格式不符返回 None"""
+        magic, version, count, _, strings_len = cls.HEADER.unpack_from(buf, 0)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            return None
+        base = len(buf) - strings_len
+
+        def text(offset, length):
+            return buf[base + offset:base + offset + length].decode("utf-8")
+
+        pos = cls.HEADER.size
+        models = []
+        for _ in range(count):
+            is_karaoke, n_lines, n_words = cls.MODEL.unpack_from(buf, pos)
+            pos += cls.MODEL.size
+            line_recs = cls.LINE.iter_unpack(buf[pos:pos + n_lines * cls.LINE.size])
+            pos += n_lines * cls.LINE.size
+            word_recs = cls.WORD.iter_unpack(buf[pos:pos + n_words * cls.WORD.size])
+            pos += n_words * cls.WORD.size
+            lines = []
+            for start, end, flags, o_off, o_len, t_off, t_len, word_count in line_recs:
+                words = tuple(LyricWord(text(off, length), ws, we) for ws, we, off, length in islice(word_recs, word_count))
+                lines.append(LyricLine(start, end, text(o_off, o_len), text(t_off, t_len), bool(flags & 1), bool(flags & 2), words))
+            models.append(LyricModel(tuple(lines), bool(is_karaoke)))
+
+        if not models:
+            return None
+        # 逐字在前：按偏好选择显示的模型，另一个作为切换模式时的备选
+        chosen = models[0] if prefer_karaoke or len(models) == 1 else models[1]
+        if len(models) == 2:
+            other = models[1] if chosen is models[0] else models[0]
+            chosen._alternate = other
+            other._alternate = chosen
+        return chosen
+
+    def load(self, key, prefer_karaoke=True):
+        """读取缓存，返回 (LyricModel, 摘要)；未命中或文件损坏返回 None"""
+        name = key + self.SUFFIX
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                model = self.decode(buf, prefer_karaoke)
+                digest = buf[8:8 + 16]
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+            print(f"歌词缓存损坏，已删除: {e}")
+            self._remove(name)
+            self.misses += 1
+            return None
+        if model is None:
+            self._remove(name)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch(name, path)
+        digest = bytes(digest)
+        model.digest = digest
+        if model._alternate is not None:
+            model._alternate.digest = digest
+        return model, digest
+
+    def read(self, name):
+        """读取同目录下的其他缓存文件（如排版数据），不存在返回 None"""
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._touch(name, path)
+        return data
+
+    def digest_of(self, key):
+        """只读文件头中的内容摘要，用于校验"""
+        try:
+            with open(os.path.join(self.directory, key + self.SUFFIX), "rb") as f:
+                header = f.read(self.HEADER.size)
+            return header[8:8 + 16] if header[:4] == self.MAGIC else None
+        except OSError:
+            return None
+
+    def store(self, key, blob, suffix=SUFFIX):
+        """原子写入缓存文件，然后按总大小淘汰最久未使用的条目"""
+        name = key + suffix
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = path + f".{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(blob)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"写入歌词缓存失败: {e}")
+            return
+        with self._lock:
+            index = self._load_index()
+            index[name] = [len(blob), time.time()]
+            self._evict(index, keep=name)
+
+    def _touch(self, name, path):
+        try:
+            os.utime(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._index is not None and name in self._index:
+                self._index[name][1] = time.time()
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        with self._lock:
+            if self._index is not None:
+                self._index.pop(name, None)
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {}
+            try:
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(self.SUFFIXES):
+                        st = entry.stat()
+                        self._index[entry.name] = [st.st_size, st.st_mtime]
+            except OSError:
+                pass
+        return self._index
+
+    def _evict(self, index, keep):
+        total = sum(size for size, _ in index.values())
+        if total <= self.max_bytes:
+            return
+        for name in sorted(index, key=lambda k: index[k][1]):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            total -= index[name][0]
+            self._remove(name)
+
+
+class LatestValueMailbox:
+    """单值邮箱：工作线程写入最新状态，界面线程取走；界面来不及处理时新值直接覆盖旧值"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._pending = False
+        self.delivered = 0  # 界面线程取走的次数
+        self.coalesced = 0  # 未被取走就被覆盖的次数
+
+    def put(self, value):
+        """写入新值；返回 True 表示此前没有待取的值，需要通知界面线程"""
+        with self._lock:
+            self._value = value
+            if self._pending:
+                self.coalesced += 1
+                return False
+            self._pending = True
+            return True
+
+    def take(self):
+        """取走最新值，没有待取的值时返回 None"""
+        with self._lock:
+            if not self._pending:
+                return None
+            value = self._value
+            self._value = None
+            self._pending = False
+            self.delivered += 1
+            return value
+
+
+class CaptureLogger:
+    """WebSocket 原始消息录制：NDJSON（可压缩、按大小轮转），后台线程写盘，可交给 replay_ws.py 回放"""
+    VERSION = 1
+    QUEUE_SIZE = 4096
+    FLUSH_INTERVAL = 1.0  # 秒，空闲或距上次落盘超过该时间就 flush，异常退出时最多丢失这么久的数据
+    _TIMESTAMP_RE = re.compile(r'"timestamp":(\d+)')
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, backups=5, url=WS_URL):
+        self.path = path
+        self.url = url  # 录制的服务地址，写入会话记录
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0  # 已写入的消息数
+        self.dropped = 0  # 队列满而丢弃的消息数
+        self.rotations = 0
+        self.session = time.time_ns() // 10**6  # 本次录制的标识（开始时刻 ms），轮转出的各文件共用
+        self._queue = queue.Queue(self.QUEUE_SIZE)
+        self._file = None
+        self._size = 0  # 当前文件已写入的未压缩字节数
+        # 在调用方线程打开第一个文件，路径或压缩格式有问题时直接抛出
+        self._open()
+        self._thread = threading.Thread(target=self._run, name="CaptureLogger", daemon=True)
+        self._thread.start()
+
+    def put(self, message):
+        """记录一条收到的消息（接收线程调用，只入队）"""
+        try:
+            self._queue.put_nowait((time.monotonic_ns(), time.time_ns(), message))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """写完队列中剩余的消息并关闭文件"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+        self._thread.join()
+
+    @staticmethod
+    def _split(path):
+        """a.ndjson.gz -> (a, .ndjson.gz)，轮转编号插在两者之间，保留扩展名以便按格式读取"""
+        stem, ext = os.path.splitext(path)
+        if ext in (".gz", ".zst"):
+            stem, inner = os.path.splitext(stem)
+            ext = inner + ext
+        return stem, ext
+
+    @classmethod
+    def rotated_path(cls, path, n):
+        stem, ext = cls._split(path)
+        return f"{stem}.{n}{ext}"
+
+    @classmethod
+    def files(cls, path):
+        """录制文件及其轮转出的旧文件，按时间从旧到新"""
+        older = []
+        n = 1
+        while os.path.exists(cls.rotated_path(path, n)):
+            older.append(cls.rotated_path(path, n))
+            n += 1
+        older.reverse()
+        if os.path.exists(path):
+            older.append(path)
+        return older
+
+    @staticmethod
+    def open_file(path, mode):
+        """按扩展名打开（可能压缩的）文件，mode 为 "rb" / "wb" """
+        if path.endswith(".gz"):
+            import gzip
+            return gzip.open(path, mode, compresslevel=6) if mode == "wb" else gzip.open(path, mode)
+        if path.endswith(".zst"):
+            try:
+                from compression import zstd
+                return zstd.open(path, mode)
+            except ImportError:
+                import zstandard
+                return zstandard.open(path, mode)
+        return open(path, mode)
+
+    @classmethod
+    def session_of(cls, name):
+        """读取文件开头的会话记录，返回录制标识；不是录制文件时返回 None"""
+        try:
+            with cls.open_file(name, "rb") as f:
+                header = json.loads(f.readline())
+        except (OSError, EOFError, ValueError):
+            return None
+        if not isinstance(header, dict) or "capture" not in header:
+            return None
+        return header.get("session", header.get("wall_ms"))
+
+    @classmethod
+    def read(cls, path, all_sessions=False):
+        """逐条读取录制文件中的消息记录；默认只读最近一次录制，all_sessions 时读出全部"""
+        names = cls.files(path)
+        if not all_sessions and names:
+            latest = cls.session_of(names[-1])
+            names = [name for name in names if cls.session_of(name) == latest] if latest is not None else names[-1:]
+        for name in names:
+            with cls.open_file(name, "rb") as f:
+                try:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break  # 异常退出时最后一行可能不完整
+                        if "raw" in record:
+                            yield record
+                except EOFError:
+                    pass  # 压缩流没有正常结束
+
+    def _open(self):
+        if self._file is None and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            self._shift()
+        self._file = self.open_file(self.path, "wb")
+        self._size = 0
+        self._write_line(json.dumps({"capture": self.VERSION, "session": self.session, "part": self.rotations,
+                                     "url": self.url, "wall_ms": time.time_ns() // 10**6,
+                                     "mono_ms": time.monotonic_ns() / 1e6}, separators=(",", ":")) + "\n")
+
+    def _shift(self):
+        """当前文件改名为 .1，旧文件依次后移，超出 backups 的删除"""
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        oldest = self.rotated_path(self.path, self.backups)
+        if os.path.exists(oldest):
+            os.remove(oldest)
+        for n in range(self.backups - 1, 0, -1):
+            src = self.rotated_path(self.path, n)
+            if os.path.exists(src):
+                os.replace(src, self.rotated_path(self.path, n + 1))
+        os.replace(self.path, self.rotated_path(self.path, 1))
+
+    def _rotate(self):
+        self._file.close()
+        self._shift()
+        self.rotations += 1
+        self._open()
+
+    def _write_line(self, text):
+        data = text.encode("utf-8")
+        self._file.write(data)
+        self._size += len(data)
+
+    def _write(self, item):
+        mono_ns, wall_ns, raw = item
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", "replace")
+        match = self._TIMESTAMP_RE.search(raw, max(0, len(raw) - 64))
+        self._write_line(f'{{"mono_ms":{mono_ns / 1e6:.3f},"wall_ms":{wall_ns // 10**6},'
+                         f'"server_ms":{match.group(1) if match else "null"},'
+                         f'"raw":{json.dumps(raw, ensure_ascii=False)}}}\n')
+        self.written += 1
+        if self._size >= self.max_bytes:
+            self._rotate()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        dirty = False
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self.FLUSH_INTERVAL)
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    break
+                if item:
+                    self._write(item)
+                    dirty = True
+                    # 一次取完积压的消息再决定是否落盘
+                    while True:
+                        try:
+                            item = self._queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is None:
+                            return
+                        self._write(item)
+                # 按时间间隔落盘，不逐条 flush（压缩文件频繁 flush 会明显降低压缩率）
+                now = time.monotonic()
+                if dirty and now - last_flush >= self.FLUSH_INTERVAL:
+                    self._file.flush()
+                    last_flush = now
+                    dirty = False
+        except Exception as e:
+            # 之后入队的消息在队列满后计为丢弃
+            print(f"!! 录制写入失败，停止录制: {e}")
+        finally:
+            self._file.close()
+
+
 class WebSocketWorker(QThread):
-    signal_lyric_data = pyqtSignal(list, bool)  # (歌词数据, 是否为逐字模式)
-    signal_progress = pyqtSignal(int)
+    signal_lyric_data = pyqtSignal(object)  # 解析完成的 LyricModel
     signal_song_info = pyqtSignal(str)
-    signal_status = pyqtSignal(bool)  # 播放状态 (True=播放, False=暂停)
+    # 进度/播放状态只关心最新值：放进邮箱，只在邮箱由空变为非空时通知界面线程
+    # 界面卡顿期间堆积的旧进度会被合并，不会在恢复后逐条回放
+    signal_progress_ready = pyqtSignal()  # progress_box: (当前进度ms, 总时长ms, 网络延迟ms, 本地接收时刻ns)
+    signal_status_ready = pyqtSignal()  # status_box: 播放状态 (True=播放, False=暂停)
+    signal_connection = pyqtSignal(str)  # 连接状态: connecting / connected / disconnected
+
+    # 断线重连：指数退避 + 随机抖动，连接成功后恢复到最小间隔
+    RECONNECT_MIN = 0.5  # 秒
+    RECONNECT_MAX = 30.0
+    # 心跳：定期发送 ping，超时未收到 pong 视为连接失效并重连
+    PING_INTERVAL = 10
+    PING_TIMEOUT = 5
+    # 关闭连接时最多等待服务器回应的时间（秒）
+    STOP_TIMEOUT = 0.3
+    # SPlayer 先推 lyric-change 再推 song-change：两者相隔不超过该时间才视为同一首歌
+    PAIR_WINDOW_NS = 5 * 10**9
+
+    def __init__(self, url=WS_URL, parent=None):
+        super().__init__(parent)
+        self.url = url
+        self.ws = None
+        self._stop_event = threading.Event()
+        self._opened = False  # 本次连接是否成功建立过
+        self.decoder = MessageDecoder()
+        self.progress_box = LatestValueMailbox()
+        self.status_box = LatestValueMailbox()
+        self.dropped = 0  # 无法解析而丢弃的消息数
+        self.prefer_karaoke = True  # 有逐字歌词时优先使用（界面线程设置）
+        self.perf = None  # 性能统计（PerfMonitor），由窗口在启用时设置
+        self.capture = None  # 原始消息录制（CaptureLogger），由窗口在启用时设置
+        # 本地歌词缓存（LyricCache，由窗口按配置设置）
+        self.cache = None
+        self._song_key = None  # 当前歌曲的缓存键
+        self._song_ns = 0  # 收到当前 song-change 的时刻
+        self._song_digest = None  # 当前歌曲真实歌词的摘要（还没收到时为 None）
+        self._shown_digest = None  # 最近交给界面线程的歌词摘要，内容相同的重发不再重新加载
+        self._unpaired = None  # (接收时刻ns, LyricModel) 还没有配对到歌曲的歌词
 
     def run(self):
+        started = time.perf_counter()
+        import websocket
+        startup_mark("导入 websocket (工作线程)", started)
         websocket.enableTrace(False)
-        self.ws = websocket.WebSocketApp(
-            WS_URL,
-            on_message=self.on_message,
-            on_error=self.on_error,
-            on_open=self.on_open
-        )
-        self.ws.run_forever()
-
-    def on_open(self, ws):
-        print(">> WebSocket 连接成功")
+        backoff = self.RECONNECT_MIN
+        while not self._stop_event.is_set():
+            self._opened = False
+            self.signal_connection.emit("connecting")
+            self.ws = websocket.WebSocketApp(
+                self.url,
+                on_message=self.on_message,
+                on_error=self.on_error,
+                on_open=self.on_open
+            )
+            if self._stop_event.is_set():
+                break
+            self.ws.run_forever(ping_interval=self.PING_INTERVAL, ping_timeout=self.PING_TIMEOUT)
+            if self._stop_event.is_set():
+                break
+            self.signal_connection.emit("disconnected")
+            if self._opened:
+                backoff = self.RECONNECT_MIN
+            # 在 [backoff/2, backoff] 内随机等待，避免多个客户端同时重连
+            if self._stop_event.wait(random.uniform(backoff / 2, backoff)):
+                break
+            backoff = min(backoff * 2, self.RECONNECT_MAX)
 
     def on_open(self, ws):
         print(">> WebSocket 连接成功")
+        self._opened = True
+        self.signal_connection.emit("connected")
 
     def stop(self):
-        if hasattr(self, 'ws') and self.ws:
-            self.ws.close()
+        """停止工作线程，最多阻塞约 STOP_TIMEOUT 的两倍"""
+        self._stop_event.set()
+        ws = self.ws
+        if ws is not None:
+            ws.close(timeout=self.STOP_TIMEOUT)
         self.quit()
-        self.wait(1000)
+        self.wait(int(self.STOP_TIMEOUT * 1000))
 
     def on_error(self, ws, error):
-        # 忽略网络断开导致的错误
+        # 网络断开/心跳超时由 run() 中的重连循环处理
         pass
 
     def on_message(self, ws, message):
+        capture = self.capture
+        if capture is not None:
+            capture.put(message)
+        perf = self.perf
+        if perf is not None:
+            decode_start = time.perf_counter_ns()
         try:
-            payload = json.loads(message)
-            msg_type = payload.get("type")
-            data = payload.get("data", {})
+            msg_type, data = self.decoder.decode(message)
 
             if msg_type == "lyric-change":
-                # 优先使用 yrcData（逐字数据），否则回退到 lrcData
-                yrc_data = data.get("yrcData", [])
-                lrc_data = data.get("lrcData", [])
-                if yrc_data:
-                    self.signal_lyric_data.emit(yrc_data, True)  # 逐字模式
+                # 在工作线程中完成解析与整理，界面线程只接收成品
+                model = LyricModel.from_payload(data, self.prefer_karaoke)
+                if self.cache is None:
+                    self.signal_lyric_data.emit(model)
                 else:
-                    self.signal_lyric_data.emit(lrc_data, False)  # 普通模式
+                    model.digest = LyricCache.payload_digest(message)
+                    self._on_lyrics_with_cache(model)
             elif msg_type == "progress-change":
-                self.signal_progress.emit(data.get("currentTime", 0))
+                # 记录接收时刻，供时钟模型补偿网络与排队延迟
+                recv_ns = time.monotonic_ns()
+                server_ts = field_of(data, "timestamp", 0)
+                delay = time.time() * 1000 - server_ts if server_ts else 0.0
+                progress = (int(field_of(data, "currentTime", 0)), int(field_of(data, "duration", 0)), delay, recv_ns)
+                if self.progress_box.put(progress):
+                    self.signal_progress_ready.emit()
             elif msg_type == "song-change":
-                self.signal_song_info.emit(data.get("title", "未知歌曲"))
+                self.signal_song_info.emit(field_of(data, "title", "未知歌曲"))
+                if self.cache is not None:
+                    self._on_song_with_cache(data)
             elif msg_type == "status-change":
-                self.signal_status.emit(data.get("status", True))
+                if self.status_box.put(bool(field_of(data, "status", True))):
+                    self.signal_status_ready.emit()
+            if perf is not None:
+                perf.record("decode", (time.perf_counter_ns() - decode_start) / 1e6, msg_type)
         except Exception as e:
+            self.dropped += 1
             print(f"解析错误: {e}")
 
+    def _on_lyrics_with_cache(self, model):
+        """收到真实歌词：显示，并与 song-change 配对后写入缓存（两者到达顺序不定，重发不参与配对）"""
+        digest = model.digest
+        if digest != self._shown_digest:
+            self._shown_digest = digest
+            self.signal_lyric_data.emit(model)
+        if digest == self._song_digest:
+            return
+        now = time.monotonic_ns()
+        if self._song_key is not None and self._song_digest is None and now - self._song_ns < self.PAIR_WINDOW_NS:
+            # song-change 刚刚先到，这份歌词属于当前歌曲
+            self._song_digest = digest
+            self._store_async(self._song_key, model)
+        else:
+            # 等待紧随其后的 song-change
+            self._unpaired = (now, model)
+
+    def _on_song_with_cache(self, data):
+        """切歌：与刚收到的歌词配对写入缓存；没有配对的歌词时立即显示缓存"""
+        key = LyricCache.song_key(data)
+        now = time.monotonic_ns()
+        unpaired, self._unpaired = self._unpaired, None
+        self._song_key = key
+        self._song_ns = now
+        self._song_digest = None
+        if key is None:
+            return
+        if unpaired is not None and now - unpaired[0] < self.PAIR_WINDOW_NS:
+            model = unpaired[1]
+            self._song_digest = model.digest
+            self._store_async(key, model)
+            return
+        cached = self.cache.load(key, self.prefer_karaoke)
+        if cached is not None:
+            model, digest = cached
+            if digest != self._shown_digest:
+                self._shown_digest = digest
+                self.signal_lyric_data.emit(model)
+
+    def _store_async(self, key, model):
+        """在后台线程中解码另一种模式并编码写入缓存，不占用消息接收线程；内容未变时不重写"""
+        cache = self.cache
+
+        def store():
+            if cache.digest_of(key) == model.digest:
+                return
+            model.alternate()
+            cache.store(key, LyricCache.encode(model, model.digest))
+
+        threading.Thread(target=store, name="LyricCacheStore", daemon=True).start()
+
+    def counters(self):
+        """消息合并/丢弃计数，用于判断界面是否跟不上"""
+        return {
+            "progress_delivered": self.progress_box.delivered,
+            "progress_coalesced": self.progress_box.coalesced,
+            "status_delivered": self.status_box.delivered,
+            "status_coalesced": self.status_box.coalesced,
+            "dropped": self.dropped,
+            "cache_hits": self.cache.hits if self.cache is not None else 0,
+            "cache_misses": self.cache.misses if self.cache is not None else 0,
+        }
+
+
+class LineLayout:
+    """单行歌词的排版缓存：逐字 x 偏移/宽度、整行宽度以及翻译文本"""
+    __slots__ = ("line", "items", "fills", "starts", "karaoke_width", "text", "text_width", "trans_text", "trans_width",
+                 "pixmaps", "geometry")
+
+    def __init__(self, line, widths, text_width):
+        self.line = line  # 用于校验缓存是否仍对应同一行
+        items = []
+        fills = []
+        x = 0
+        fill_end = 0
+        for word_info, width in zip(line.words, widths):
+            word = word_info.word
+            start = word_info.start
+            end = word_info.end
+            items.append((word, start, end, x, width))
+            # 填充用的时间保证单调：空格等无时间的字 (0, 0) 紧接上一个字结束
+            fill_start = max(start, fill_end)
+            fill_end = max(end, fill_start)
+            fills.append((fill_start, fill_end, x, width))
+            x += width
+        self.items = tuple(items)  # (文字, 开始, 结束, x 偏移, 宽度)
+        self.fills = tuple(fills)  # (填充开始, 填充结束, x 偏移, 宽度)，按时间单调
+        self.starts = tuple(fill[0] for fill in fills)
+        self.karaoke_width = x  # 逐字绘制时的整行宽度
+        self.text = line.original
+        self.text_width = text_width  # 整行绘制时的宽度
+        self.trans_text = f"({line.trans})" if line.trans else ""
+        self.trans_width = None  # (翻译字号, 宽度)，见 KaraokeLyricWidget._trans_width
+        self.pixmaps = None  # (缓存键, 已唱位图, 未唱位图, 基线偏移)，首次绘制时生成
+        self.geometry = None  # 超宽处理参数，见 KaraokeLyricWidget._line_geometry
+
+    @classmethod
+    def measure(cls, line, fm):
+        """用给定字体度量测量一行（任意线程均可调用）"""
+        return cls(line, [fm.horizontalAdvance(w.word) for w in line.words], fm.horizontalAdvance(line.original))
+
+    def next_change_delay(self, current_time, frame_ms):
+        """距离本行下一次可见变化的时间 (ms)，没有则返回 None"""
+        i = bisect.bisect_right(self.starts, current_time) - 1
+        if i >= 0:
+            start, end, x, width = self.fills[i]
+            if current_time < end:
+                # 正在填充：每移动一个像素才需要重绘，但不快于屏幕刷新
+                return max(frame_ms, (end - start) / max(width, 1))
+        if i + 1 < len(self.starts):
+            return self.starts[i + 1] - current_time
+        return None
+
+    def fill_x(self, current_time):
+        """逐字填充的分界 x 坐标"""
+        i = bisect.bisect_right(self.starts, current_time) - 1
+        if i < 0:
+            return 0
+        start, end, x, width = self.fills[i]
+        if current_time >= end:
+            return x + width
+        return x + int(width * (current_time - start) / max(end - start, 1))
+
+
+class LayoutPrecomputer(QObject):
+    """后台预计算整首歌的行排版（逐字、整行、翻译宽度），可持久化为 .lym 文件"""
+    signal_done = pyqtSignal(object, object)  # (LyricModel, {排版缓存键: LineLayout})
+    MAGIC = b"LYM2"
+    SUFFIX = ".lym"
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._jobs = LatestValueMailbox()
+        self._wake = threading.Event()
+        self._thread = None
+        self.loaded = 0  # 从持久化数据读取的次数
+        self.measured = 0  # 实际测量的次数
+
+    def submit(self, model, family, specs, cache=None):
+        """提交一首歌的预排版任务（界面线程调用）"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="LayoutPrecomputer", daemon=True)
+            self._thread.start()
+        self._jobs.put((model, family, specs, cache))
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            job = self._jobs.take()
+            if job is None:
+                continue
+            try:
+                self.signal_done.emit(job[0], self.compute(*job))
+            except Exception as e:
+                print(f"预排版失败: {e}")
+
+    def compute(self, model, family, specs, cache=None):
+        """计算（或读取持久化的）整首歌排版，返回 {排版缓存键: LineLayout}"""
+        name = self._cache_name(model, family, specs) if cache is not None else None
+        widths = self._load(cache, name, model, specs) if name else None
+        if widths is None:
+            widths = self._measure(model, family, specs)
+            self.measured += 1
+            if name:
+                cache.store(name, self.MAGIC + struct.pack("<I", len(widths)) + widths.tobytes(), self.SUFFIX)
+        else:
+            self.loaded += 1
+
+        layouts = {}
+        pos = 0
+        for size, bold, is_bg, trans_size in specs:
+            for line in model.lines:
+                if line.is_bg != is_bg:
+                    continue
+                n = len(line.words)
+                layout = LineLayout(line, widths[pos + 2:pos + 2 + n], widths[pos])
+                if layout.trans_text:
+                    layout.trans_width = (trans_size, widths[pos + 1])
+                layouts[(family, size, bold, id(line))] = layout
+                pos += 2 + n
+        return layouts
+
+    @staticmethod
+    def _measure(model, family, specs):
+        """按 specs 顺序，每行依次记录 [整行宽度, 翻译宽度, 各字宽度...]"""
+        widths = array("i")
+        for size, bold, is_bg, trans_size in specs:
+            font = QFont(family, size)
+            font.setBold(bold)
+            fm = QFontMetrics(font)
+            trans_fm = QFontMetrics(QFont(family, trans_size))
+            for line in model.lines:
+                if line.is_bg != is_bg:
+                    continue
+                widths.append(fm.horizontalAdvance(line.original))
+                widths.append(trans_fm.horizontalAdvance(f"({line.trans})") if line.trans else 0)
+                widths.extend(fm.horizontalAdvance(w.word) for w in line.words)
+        return widths
+
+    @staticmethod
+    def _cache_name(model, family, specs):
+        if model.digest is None:
+            return None
+        # 实际解析到的字体与 Qt 版本也参与键计算，字体安装/升级后不会误用旧数据
+        resolved = QFontInfo(QFont(family)).family()
+        config = f"{family}|{resolved}|{specs}|{QT_VERSION_STR}"
+        return model.digest.hex() + "-" + hashlib.blake2b(config.encode("utf-8"), digest_size=8).hexdigest()
+
+    def _load(self, cache, name, model, specs):
+        data = cache.read(name + self.SUFFIX)
+        if data is None or data[:4] != self.MAGIC:
+            return None
+        count = struct.unpack_from("<I", data, 4)[0]
+        expected = sum(2 + len(line.words) for spec in specs for line in model.lines if line.is_bg == spec[2])
+        widths = array("i")
+        if count != expected or len(data) != 8 + count * widths.itemsize:
+            return None
+        widths.frombytes(data[8:])
+        return widths
+
 
 class KaraokeLyricWidget(QWidget):
     """自定义歌词绘制组件，支持逐字填充动画和多行显示"""
@@ -86,7 +1194,7 @@ class KaraokeLyricWidget(QWidget):
         self.setAttribute(Qt.WidgetAttribute.WA_TranslucentBackground)
         
         # 歌词数据 - 支持多行
-        self.lines = []  # [{"words": [...], "trans": "", "isBG": False}, ...]
+        self.lines = []  # [LyricLine, ...]
         self.current_time = 0
         self.is_karaoke_mode = False
         
@@ -123,8 +1231,61 @@ class KaraokeLyricWidget(QWidget):
         # 普通文本（非卡拉OK模式）
         self.plain_text = ""
         
+        # 排版缓存：字体 (family, size, bold) -> (QFont, QFontMetrics)
+        # 行排版 (family, size, bold, 行标识) -> LineLayout
+        self._font_cache = {}
+        self._layout_cache = {}
+        
+        # 逐行预渲染位图：每行只光栅化一次，之后每帧只需两次裁剪贴图
+        self.use_line_pixmaps = True
+        
+        # 后备缓冲：内容变化时只重画变化区域到 QImage，paintEvent 只负责贴图
+        self.use_backbuffer = False
+        self._backbuffer = None
+        self._backbuffer_dirty = QRect()  # 自上次重画以来内容变化的区域
+        self._backbuffer_full = True  # 整个缓冲都需要重画
+        
+        # 超宽歌词处理："scroll" / "fit" / "none"
+        self.overflow_mode = "scroll"
+        self._overflow_state = None
+        
+        # 局部重绘：记录上一次各行的填充分界，每次只重绘变化的横向区间
+        self._fill_lines = None  # 上一次显示的各行引用，用于判断行是否变化
+        self._fill_xs = []  # 上一次各行的填充分界 x（屏幕坐标）
+        self._fill_offsets = []  # 上一次各行的滚动距离
+
+        self.perf = None  # 性能统计（PerfMonitor），由窗口在启用时设置
+        
         self.setMinimumHeight(80)  # 增加高度支持多行
 
+    # apply_config 读取的配置项；其中 LAYOUT_KEYS 变化后需要重新排版
+    CONFIG_KEYS = frozenset(("main_font_size", "trans_font_size", "bg_font_size", "main_size_no_bg", "main_size_with_bg",
+                             "font_family", "use_line_pixmaps", "overflow_mode", "use_backbuffer"))
+    LAYOUT_KEYS = frozenset(("font_family", "trans_font_size", "bg_font_size", "main_size_no_bg", "main_size_with_bg"))
+
+    def apply_config(self, config, changed=None):
+        """从配置字典应用字体、字号和绘制方式；changed 为变化的键集合（None 表示初始化）"""
+        self.main_font_size = config.get("main_font_size", 24)
+        self.trans_font_size = config.get("trans_font_size", 13)
+        self.bg_font_size = config.get("bg_font_size", 14)
+        self.main_size_no_bg = config.get("main_size_no_bg", 24)
+        self.main_size_with_bg = config.get("main_size_with_bg", 17)
+        self.font_family = config.get("font_family", "Microsoft YaHei UI")
+        self.use_line_pixmaps = config.get("use_line_pixmaps", True)
+        self.overflow_mode = config.get("overflow_mode", "scroll")
+        self.use_backbuffer = config.get("use_backbuffer", False)
+        if changed is None:
+            return
+        if "font_family" in changed:
+            self.invalidate_layout()
+            return
+        # 排版按 (字体, 字号, 粗体, 行) 缓存，字号变化只是换用另一组键，旧字号的排版保留（改回时直接命中）；
+        # 翻译字号、超宽处理和预渲染位图的缓存键里都带着各自的参数，只需整体重绘一次
+        if "use_backbuffer" in changed and not self.use_backbuffer:
+            self._backbuffer = None
+        self._fill_lines = None
+        self.update()
+
     @pyqtProperty(float)
     def anim_progress(self):
         return self._anim_progress
@@ -140,17 +1301,108 @@ class KaraokeLyricWidget(QWidget):
     def set_plain_text(self, text, animate=True):
         """设置普通文本（非卡拉OK模式）"""
         # 构造一个模拟的歌词行
-        fake_line = {
-            "words": [{"word": text, "startTime": 0, "endTime": 0}],
-            "trans": "",
-            "isBG": False
-        }
-        self.set_multi_lines([fake_line], is_karaoke=False, animate=animate)
+        self.set_multi_lines([LyricLine.plain(text)], is_karaoke=False, animate=animate)
     
     def set_time(self, current_time):
-        """更新当前时间并重绘"""
+        """更新当前时间并重绘（只重绘填充分界移动过的区域）"""
         self.current_time = current_time
-        self.update()
+        dirty = self._fill_dirty_rect()
+        if dirty is None:
+            self.update()
+        elif not dirty.isEmpty():
+            self.update(dirty)
+
+    def next_change_delay(self, current_time, frame_ms):
+        """距离当前显示内容下一次变化的时间 (ms)，没有则返回 None"""
+        if not self.lines:
+            return None
+        is_karaoke = self.is_karaoke_mode
+        main_size = self._main_size_for(self.lines)
+        delay = None
+        for line_data in self.lines:
+            if line_data.is_bg:
+                layout = self._get_layout(line_data, self.bg_font_size, False)
+            else:
+                layout = self._get_layout(line_data, main_size, True)
+            if is_karaoke and layout.items:
+                line_delay = layout.next_change_delay(current_time, frame_ms)
+            else:
+                line_delay = self._scroll_change_delay(layout, line_data, current_time, frame_ms)
+            if line_delay is not None and (delay is None or line_delay < delay):
+                delay = line_delay
+        return delay
+
+    def _scroll_change_delay(self, layout, line_data, current_time, frame_ms):
+        """普通歌词超宽滚动时的下一帧时间：滚动一个像素才需要重绘"""
+        geometry = self._line_geometry(layout, False, not line_data.is_bg)
+        if not geometry[5] or line_data.end <= line_data.start:
+            return None
+        if current_time < line_data.start:
+            return line_data.start - current_time
+        if current_time < line_data.end:
+            return max(frame_ms, (line_data.end - line_data.start) / max(geometry[4], 1))
+        return None
+
+    def _fill_dirty_rect(self):
+        """计算本次时间变化需要重绘的区域；返回 None 表示需要整体重绘"""
+        lines = self.lines
+        if not lines or self._anim_progress < 1.0 or self.color_singing != self.color_sung:
+            # 动画进行中、正在唱与已唱颜色不同时整体重绘
+            self._fill_lines = None
+            return None
+        
+        main_size = self._main_size_for(lines)
+        is_karaoke = self.is_karaoke_mode
+        prev_lines = self._fill_lines
+        prev_xs = self._fill_xs
+        prev_offsets = self._fill_offsets
+        same_lines = prev_lines is not None and len(prev_lines) == len(lines)
+        scrolled = False
+        overflow_key = self._overflow_key()
+        left = right = None
+        for i, line_data in enumerate(lines):
+            if line_data.is_bg:
+                layout = self._get_layout(line_data, self.bg_font_size, False)
+            else:
+                layout = self._get_layout(line_data, main_size, True)
+            geometry = self._line_geometry(layout, is_karaoke, not line_data.is_bg, overflow_key)
+            # 非逐字模式下时间变化不影响画面，分界恒为 0；超宽行换算到屏幕坐标
+            x = layout.fill_x(self.current_time) if is_karaoke and layout.items else 0
+            offset = 0
+            if geometry[5]:
+                offset = self._scroll_offset(layout, geometry)
+                x = int(x * geometry[3]) - offset
+            elif geometry[3] != 1.0:
+                x = int(x * geometry[3])
+            if same_lines and prev_lines[i] is line_data:
+                if prev_offsets[i] != offset:
+                    # 整行滚动过，局部区域不够用
+                    scrolled = True
+                old_x = prev_xs[i]
+                if old_x != x:
+                    lo, hi = min(old_x, x), max(old_x, x)
+                    left = lo if left is None else min(left, lo)
+                    right = hi if right is None else max(right, hi)
+            else:
+                same_lines = False
+                if prev_lines is None or len(prev_lines) != len(lines):
+                    prev_lines = [None] * len(lines)
+                    prev_xs = [0] * len(lines)
+                    prev_offsets = [0] * len(lines)
+            prev_lines[i] = line_data
+            prev_xs[i] = x
+            prev_offsets[i] = offset
+        self._fill_lines = prev_lines
+        self._fill_xs = prev_xs
+        self._fill_offsets = prev_offsets
+        
+        if not same_lines or scrolled:
+            # 显示的行发生变化或超宽行滚动了，整体重绘
+            return None
+        if left is None:
+            return QRect()
+        # 左右各留 2px 给抗锯齿边缘
+        return QRect(left - 2, 0, right - left + 4, self.height())
     
     def set_multi_lines(self, lines, is_karaoke, animate=True):
         """设置多行歌词（主歌词+背景歌词）"""
@@ -168,6 +1420,7 @@ class KaraokeLyricWidget(QWidget):
             self.anim.setEndValue(1.0)
             self.anim.start()
         else:
+            self.anim.stop()
             self.old_lines = [] # 无动画时清除旧行
             self._apply_multi_lines(lines, is_karaoke)
             self._anim_progress = 1.0
@@ -176,75 +1429,267 @@ class KaraokeLyricWidget(QWidget):
         """应用多行歌词"""
         self.lines = lines
         self.is_karaoke_mode = is_karaoke
+        self._prepare_layouts(lines)
         
         # 兼容旧接口：如果只有一行，同步到 words/trans
         if lines and len(lines) > 0:
-            main_line = next((l for l in lines if not l.get("isBG", False)), lines[0])
-            self.words = main_line.get("words", [])
-            self.trans = main_line.get("trans", "")
+            main_line = next((l for l in lines if not l.is_bg), lines[0])
+            self.words = main_line.words
+            self.trans = main_line.trans
             if self.words:
-                self.plain_text = "".join([w.get("word", "") for w in self.words])
+                self.plain_text = main_line.original
         
         self.update()
 
+    def invalidate_layout(self):
+        """清空字体与排版缓存（字体或字号变化后调用）"""
+        self._font_cache.clear()
+        self._layout_cache.clear()
+        self._fill_lines = None
+        self.update()
+
+    def _get_font(self, size, bold):
+        """获取缓存的 (QFont, QFontMetrics)"""
+        key = (self.font_family, size, bold)
+        cached = self._font_cache.get(key)
+        if cached is None:
+            font = QFont(self.font_family, size)
+            font.setBold(bold)
+            cached = (font, QFontMetrics(font))
+            self._font_cache[key] = cached
+        return cached
+
+    def _get_layout(self, line_data, size, bold):
+        """获取行排版，首次使用时计算并缓存"""
+        key = (self.font_family, size, bold, id(line_data))
+        layout = self._layout_cache.get(key)
+        if layout is None or layout.line is not line_data:
+            if len(self._layout_cache) >= 1024:
+                self._layout_cache.clear()
+            layout = LineLayout.measure(line_data, self._get_font(size, bold)[1])
+            self._layout_cache[key] = layout
+        return layout
+
+    FIT_MIN_SCALE = 0.6  # fit 模式最多缩小到的比例
+    SCROLL_ANCHOR = 0.4  # 滚动时演唱位置保持在可见宽度的该比例处
+
+    def _overflow_key(self):
+        """超宽处理参数依赖的 (可用宽度, 翻译字号, 模式)；不变时返回同一个对象，各行只需比较身份"""
+        key = self._overflow_state
+        width = self.width()
+        if key is None or key[0] != width or key[1] != self.trans_font_size or key[2] != self.overflow_mode:
+            key = self._overflow_state = (width, self.trans_font_size, self.overflow_mode)
+        return key
+
+    def _line_geometry(self, layout, is_karaoke, is_main, key=None):
+        """一行的超宽处理参数 (键, 逐字, 主歌词, 缩放比例, 缩放后内容宽度, 最大滚动距离)，每行每种设置只计算一次"""
+        if key is None:
+            key = self._overflow_key()
+        geometry = layout.geometry
+        if geometry is not None and geometry[0] is key and geometry[1] == is_karaoke and geometry[2] == is_main:
+            return geometry
+        avail, trans_size, mode = key
+        if not is_main:
+            trans_size -= 2
+        content = layout.karaoke_width if is_karaoke and layout.items else layout.text_width
+        if layout.trans_text:
+            content += 15 + self._trans_width(layout, trans_size)
+        if mode == "none" or content <= avail:
+            geometry = (key, is_karaoke, is_main, 1.0, content, 0)
+        else:
+            scale = max(self.FIT_MIN_SCALE, avail / content) if mode == "fit" else 1.0
+            geometry = (key, is_karaoke, is_main, scale, content * scale, max(0, int(content * scale - avail + 0.999)))
+        layout.geometry = geometry
+        return geometry
+
+    def _scroll_offset(self, layout, geometry):
+        """当前时间的水平滚动距离：让演唱位置保持在可见范围内（每帧只做几次算术）"""
+        max_offset = geometry[5]
+        line = layout.line
+        if not max_offset or line.end <= line.start:
+            return 0  # 放得下，或是没有时间信息的提示文本（显示开头）
+        if geometry[1] and layout.items:
+            anchor = layout.fill_x(self.current_time) * geometry[3]
+        else:
+            # 普通歌词没有逐字时间，按整行时间进度滚动
+            progress = (self.current_time - line.start) / max(line.end - line.start, 1)
+            anchor = geometry[4] * min(max(progress, 0.0), 1.0)
+        return min(max(int(anchor - geometry[0][0] * self.SCROLL_ANCHOR), 0), max_offset)
+
+    def layout_specs(self):
+        """整首歌预排版需要的 (字号, 粗体, 是否背景歌词, 翻译字号) 组合，与 _prepare_layouts 的取值一致"""
+        trans_size = self.trans_font_size
+        specs = [(self.main_size_no_bg, True, False, trans_size)]
+        if self.main_size_with_bg != self.main_size_no_bg:
+            specs.append((self.main_size_with_bg, True, False, trans_size))
+        specs.append((self.bg_font_size, False, True, trans_size - 2))
+        return tuple(specs)
+
+    def install_layouts(self, layouts):
+        """装入后台预计算的行排版；已有的条目（可能带着预渲染位图）保持不变，只补上新的翻译宽度"""
+        if len(self._layout_cache) + len(layouts) > 1024:
+            self._layout_cache.clear()
+        cache = self._layout_cache
+        for key, layout in layouts.items():
+            current = cache.get(key)
+            if current is None:
+                cache[key] = layout
+            elif current.line is layout.line and layout.trans_width is not None:
+                current.trans_width = layout.trans_width
+
+    def _trans_width(self, layout, trans_size):
+        """翻译文本宽度：优先使用预排版测好的值，字号不同时才在这里测量"""
+        cached = layout.trans_width
+        if cached is None or cached[0] != trans_size:
+            cached = layout.trans_width = (trans_size, self._get_font(trans_size, False)[1].horizontalAdvance(layout.trans_text))
+        return cached[1]
+
+    def _main_size_for(self, lines):
+        """动态调整字体大小：有BG时变小，无BG时恢复"""
+        if any(l.is_bg for l in lines):
+            return self.main_size_with_bg
+        return self.main_size_no_bg
+
+    def _prepare_layouts(self, lines):
+        """设置新行时预先计算排版，避免绘制时再测量文字"""
+        if not lines:
+            return
+        main_size = self._main_size_for(lines)
+        for line_data in lines:
+            if line_data.is_bg:
+                layout = self._get_layout(line_data, self.bg_font_size, False)
+                trans_size = self.trans_font_size - 2
+            else:
+                layout = self._get_layout(line_data, main_size, True)
+                trans_size = self.trans_font_size
+            if layout.trans_text:
+                self._trans_width(layout, trans_size)
+
     def _draw_line_group(self, painter, lines, y_offset, opacity, is_karaoke):
         """绘制一组歌词（支持透明度和垂直偏移）"""
         if opacity <= 0: return
         painter.setOpacity(opacity)
         
-        main_lines = [l for l in lines if not l.get("isBG", False)] if lines else []
-        bg_lines = [l for l in lines if l.get("isBG", False)] if lines else []
+        main_lines = [l for l in lines if not l.is_bg] if lines else []
+        bg_lines = [l for l in lines if l.is_bg] if lines else []
         
         # 动态调整字体大小：有BG时变小，无BG时恢复
+        current_main_size = self._main_size_for(lines) if lines else self.main_size_no_bg
         if bg_lines:
-            current_main_size = self.main_size_with_bg
             main_base_y = self.height() // 3 + current_main_size // 3
             bg_base_y = main_base_y + current_main_size + 4
         else:
-            current_main_size = self.main_size_no_bg
             main_base_y = self.height() // 2 + current_main_size // 3
             bg_base_y = main_base_y + current_main_size + 8
             
         main_y = main_base_y + y_offset
         bg_y = bg_base_y + y_offset
 
-        # 主字体
-        main_font = QFont(self.font_family, current_main_size)
-        main_font.setBold(True)
-        # 背景歌词字体
-        bg_font = QFont(self.font_family, self.bg_font_size)
-        bg_font.setBold(False)
-
         # 绘制主歌词
         for line_data in main_lines:
-            self._draw_single_line(painter, line_data, main_font, main_y, is_karaoke, self.color_sung, self.color_singing, self.color_unsung, self.main_font_size, True)
+            self._draw_single_line(painter, line_data, current_main_size, True, main_y, is_karaoke, self.color_sung, self.color_singing, self.color_unsung, True)
 
         # 绘制背景歌词
         for line_data in bg_lines:
-            self._draw_single_line(painter, line_data, bg_font, bg_y, is_karaoke, self.color_sung, self.color_singing, self.color_bg, self.bg_font_size, False)
+            self._draw_single_line(painter, line_data, self.bg_font_size, False, bg_y, is_karaoke, self.color_sung, self.color_singing, self.color_bg, False)
 
-    def _draw_single_line(self, painter, line_data, font, y, is_karaoke, c_sung, c_singing, c_unsung, font_size, is_main):
-        x = 0
-        words = line_data.get("words", [])
-        trans = line_data.get("trans", "")
-        fm = QFontMetrics(font)
-        
-        if is_karaoke and words:
-            for word_info in words:
-                word = word_info.get("word", "")
-                start = word_info.get("startTime", 0)
-                end = word_info.get("endTime", 0)
-                word_width = fm.horizontalAdvance(word)
-                
-                if self.current_time >= end:
-                    painter.setFont(font)
+    def _get_line_pixmaps(self, layout, size, bold, is_karaoke, c_sung, c_unsung, trans_size, c_trans, scale=1.0, dpr=1.0):
+        """获取（必要时生成）一行的已唱/未唱两张位图，按目标设备的像素比（及超宽缩放比例）渲染"""
+        key = (is_karaoke, c_sung.rgba(), c_unsung.rgba(), trans_size, c_trans.rgba(), dpr, scale)
+        if layout.pixmaps is not None and layout.pixmaps[0] == key:
+            return layout.pixmaps
+        
+        font, fm = self._get_font(size, bold)
+        trans_font, trans_fm = self._get_font(trans_size, False)
+        ascent = max(fm.ascent(), trans_fm.ascent())
+        height = ascent + max(fm.descent(), trans_fm.descent()) + 1
+        text_width = layout.karaoke_width if is_karaoke and layout.items else layout.text_width
+        width = text_width + 4  # 预留字形右侧溢出
+        if layout.trans_text:
+            width += 15 + self._trans_width(layout, trans_size)
+        if scale != 1.0:
+            width *= scale
+            height *= scale
+        
+        pixmaps = []
+        for color in (c_sung, c_unsung):
+            pm = QPixmap(max(1, int(width * dpr)), max(1, int(height * dpr)))
+            pm.setDevicePixelRatio(dpr)
+            pm.fill(Qt.GlobalColor.transparent)
+            p = QPainter(pm)
+            p.setRenderHint(QPainter.RenderHint.Antialiasing)
+            p.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+            if scale != 1.0:
+                p.scale(scale, scale)
+            p.setFont(font)
+            p.setPen(color)
+            if is_karaoke and layout.items:
+                for word, start, end, x, word_width in layout.items:
+                    p.drawText(x, ascent, word)
+            else:
+                p.drawText(0, ascent, layout.text)
+            if layout.trans_text:
+                p.setFont(trans_font)
+                p.setPen(c_trans)
+                p.drawText(text_width + 15, ascent, layout.trans_text)
+            p.end()
+            pixmaps.append(pm)
+        
+        layout.pixmaps = (key, pixmaps[0], pixmaps[1], ascent * scale)
+        return layout.pixmaps
+
+    def _draw_line_pixmaps(self, painter, layout, size, bold, y, is_karaoke, c_sung, c_unsung, is_main, scale=1.0, offset=0):
+        """位图模式：按填充分界把已唱/未唱位图各贴一次；超宽行只是贴图位置左移"""
+        trans_size = self.trans_font_size if is_main else self.trans_font_size - 2
+        c_trans = self.color_trans if is_main else self.color_bg
+        # 按实际绘制目标的像素比光栅化：无界面渲染到高 DPR 的 QImage 时，隐藏窗口自身的像素比仍是 1
+        dpr = painter.device().devicePixelRatioF()
+        key, sung, unsung, ascent = self._get_line_pixmaps(layout, size, bold, is_karaoke, c_sung, c_unsung, trans_size, c_trans, scale, dpr)
+        
+        width = sung.width() / dpr
+        height = sung.height() / dpr
+        top = y - ascent
+        fill = min(layout.fill_x(self.current_time) * scale, width) if is_karaoke and layout.items else 0
+        if fill > 0:
+            painter.drawPixmap(QRectF(-offset, top, fill, height), sung, QRectF(0, 0, fill * dpr, sung.height()))
+        if fill < width:
+            painter.drawPixmap(QRectF(fill - offset, top, width - fill, height), unsung,
+                               QRectF(fill * dpr, 0, (width - fill) * dpr, unsung.height()))
+
+    def _draw_single_line(self, painter, line_data, size, bold, y, is_karaoke, c_sung, c_singing, c_unsung, is_main):
+        layout = self._get_layout(line_data, size, bold)
+        geometry = self._line_geometry(layout, is_karaoke, is_main)
+        scale = geometry[3]
+        offset = self._scroll_offset(layout, geometry)
+        # 位图模式只区分已唱/未唱两种颜色，正在唱的颜色不同时回退到逐字绘制
+        if self.use_line_pixmaps and c_singing == c_sung:
+            self._draw_line_pixmaps(painter, layout, size, bold, y, is_karaoke, c_sung, c_unsung, is_main, scale, offset)
+            return
+        if scale != 1.0 or offset:
+            # 超宽行：以基线为中心缩放并整体左移，排版本身不变
+            painter.save()
+            painter.translate(-offset, y)
+            painter.scale(scale, scale)
+            painter.translate(0, -y)
+            self._draw_line_direct(painter, layout, size, bold, y, is_karaoke, c_sung, c_singing, c_unsung, is_main)
+            painter.restore()
+        else:
+            self._draw_line_direct(painter, layout, size, bold, y, is_karaoke, c_sung, c_singing, c_unsung, is_main)
+
+    def _draw_line_direct(self, painter, layout, size, bold, y, is_karaoke, c_sung, c_singing, c_unsung, is_main):
+        """逐字直接绘制（不使用预渲染位图）"""
+        painter.setFont(self._get_font(size, bold)[0])
+        
+        if is_karaoke and layout.items:
+            current_time = self.current_time
+            for word, start, end, x, word_width in layout.items:
+                if current_time >= end:
                     painter.setPen(c_sung)
                     painter.drawText(x, y, word)
-                elif self.current_time >= start:
-                    progress = (self.current_time - start) / max(end - start, 1)
+                elif current_time >= start:
+                    progress = (current_time - start) / max(end - start, 1)
                     fill_width = int(word_width * progress)
                     
-                    painter.setFont(font)
                     painter.setPen(c_singing)
                     painter.setClipRect(x, 0, fill_width, self.height())
                     painter.drawText(x, y, word)
@@ -255,29 +1700,105 @@ class KaraokeLyricWidget(QWidget):
                     
                     painter.setClipping(False)
                 else:
-                    painter.setFont(font)
                     painter.setPen(c_unsung)
                     painter.drawText(x, y, word)
-                
-                x += word_width
+            x = layout.karaoke_width
         else:
-            text = "".join([w.get("word", "") for w in words]) if words else ""
-            painter.setFont(font)
             painter.setPen(c_unsung)
-            painter.drawText(x, y, text)
-            x += fm.horizontalAdvance(text)
+            painter.drawText(0, y, layout.text)
+            x = layout.text_width
             
         # 绘制翻译
-        if trans:
+        if layout.trans_text:
             # 翻译字号稍微小一点
             trans_size = self.trans_font_size if is_main else self.trans_font_size - 2
-            trans_font = QFont(self.font_family, trans_size)
-            painter.setFont(trans_font)
+            painter.setFont(self._get_font(trans_size, False)[0])
             painter.setPen(self.color_trans if is_main else self.color_bg)
-            painter.drawText(x + 15, y, f"({trans})")
+            painter.drawText(x + 15, y, layout.trans_text)
+
+    def render_frame(self, lines, is_karaoke, current_time, progress=1.0, old_lines=(), old_karaoke=None, image=None):
+        """把指定状态的一帧直接画到 QImage（尺寸一致时复用 image），会覆盖控件当前的显示状态"""
+        self.anim.stop()
+        self.lines = lines
+        self.is_karaoke_mode = is_karaoke
+        self.old_lines = old_lines
+        self.old_karaoke_mode = is_karaoke if old_karaoke is None else old_karaoke
+        self._anim_progress = progress
+        self.current_time = current_time
+        self._fill_lines = None  # 下一次 set_time 整体重绘
+        self._backbuffer_full = True
+        
+        dpr = image.devicePixelRatio() if image is not None else 1.0
+        width = max(1, int(self.width() * dpr))
+        height = max(1, int(self.height() * dpr))
+        if image is None or image.width() != width or image.height() != height:
+            image = QImage(width, height, image.format() if image is not None else QImage.Format.Format_ARGB32_Premultiplied)
+            image.setDevicePixelRatio(dpr)
+        image.fill(0)
+        painter = QPainter(image)
+        self._paint_content(painter)
+        painter.end()
+        return image
+
+    def update(self, *args):
+        """请求重绘即表示内容有变化：同时记录后备缓冲需要重画的区域"""
+        if self.use_backbuffer:
+            if not args:
+                self._backbuffer_full = True
+            elif not self._backbuffer_full:
+                rect = args[0] if len(args) == 1 else QRect(*args)
+                self._backbuffer_dirty = self._backbuffer_dirty.united(rect if isinstance(rect, QRect) else rect.boundingRect())
+        super().update(*args)
 
     def paintEvent(self, event):
-        painter = QPainter(self)
+        perf = self.perf
+        if perf is not None:
+            paint_start = time.perf_counter_ns()
+        if self.use_backbuffer:
+            image = self._get_backbuffer()
+            rect = event.rect()
+            dpr = image.devicePixelRatio()
+            painter = QPainter(self)
+            painter.drawImage(QRectF(rect), image, QRectF(rect.x() * dpr, rect.y() * dpr, rect.width() * dpr, rect.height() * dpr))
+            painter.end()
+        else:
+            self._backbuffer = None
+            painter = QPainter(self)
+            self._paint_content(painter)
+            painter.end()
+        if perf is not None:
+            perf.record("paint", (time.perf_counter_ns() - paint_start) / 1e6)
+
+    def _get_backbuffer(self):
+        """返回与当前内容一致的后备缓冲（预乘 ARGB，按设备像素比），只重画变化过的区域"""
+        dpr = self.devicePixelRatioF()
+        width = max(1, int(self.width() * dpr))
+        height = max(1, int(self.height() * dpr))
+        image = self._backbuffer
+        if image is None or image.width() != width or image.height() != height or image.devicePixelRatio() != dpr:
+            image = self._backbuffer = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+            image.setDevicePixelRatio(dpr)
+            self._backbuffer_full = True
+        dirty = self._backbuffer_dirty
+        if not self._backbuffer_full and dirty.isEmpty():
+            return image  # 只是窗口被遮挡后重新露出等情况，内容没变
+        
+        if self._backbuffer_full:
+            image.fill(0)
+        painter = QPainter(image)
+        if not self._backbuffer_full:
+            painter.setClipRect(dirty)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+            painter.fillRect(dirty, Qt.GlobalColor.transparent)
+            painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+        self._paint_content(painter)
+        painter.end()
+        self._backbuffer_full = False
+        self._backbuffer_dirty = QRect()
+        return image
+
+    def _paint_content(self, painter):
+        """绘制全部歌词内容（直接绘制到窗口或绘制到后备缓冲）"""
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
         
@@ -300,38 +1821,630 @@ class KaraokeLyricWidget(QWidget):
                 opacity = 1.0
                 y_offset = 0
             self._draw_line_group(painter, self.lines, y_offset, opacity, self.is_karaoke_mode)
-            
-        painter.end()
 
-class DesktopLyricWindow(QWidget):
+class PlaybackClock:
+    """播放进度时钟模型：以服务器进度为锚点，用单调时钟外推并平滑校准"""
+    ALPHA = 0.3  # 位置修正系数
+    BETA = 0.05  # 速率修正系数
+    SLEW_MS = 150  # 偏差不超过该值时只做平滑修正
+    SEEK_MS = 1000  # 向前偏差超过该值视为跳转
+    BACK_SEEK_MS = 300  # 向后偏差超过该值视为跳转
+    SLEW_PERIOD_MS = 400.0  # 平滑修正分摊的时长
+    MIN_RATE = 0.5
+    MAX_RATE = 2.0
+
     def __init__(self):
+        self.playing = True
+        self.rate = 1.0
+        self._anchor_pos = 0.0  # 锚点处的播放进度 (ms)
+        self._anchor_ns = time.monotonic_ns()  # 锚点对应的本地单调时钟 (ns)
+        self._last_sample_ns = None  # 上一次校准样本的时刻，None 表示下一次需要硬锚定
+        self._delays = deque(maxlen=16)  # 最近的网络延迟样本 (ms)
+        self._slew = 0.0  # 锚点之后尚待分摊的位置修正 (ms)
+        self._suspect = 0  # 上一次样本超出 SLEW_MS 的方向（滞回用），0 表示没有
+
+    def position(self, now_ns=None):
+        """返回当前播放进度 (ms)"""
+        if not self.playing:
+            return int(self._anchor_pos)
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        return int(self._extrapolate(now_ns))
+
+    def _extrapolate(self, now_ns):
+        elapsed = (now_ns - self._anchor_ns) / 1e6
+        slew = self._slew
+        if slew and elapsed < self.SLEW_PERIOD_MS:
+            slew *= max(elapsed, 0.0) / self.SLEW_PERIOD_MS
+        return self._anchor_pos + elapsed * self.rate + slew
+
+    def sync(self, position, delay_ms=0.0, recv_ns=None, discontinuity=False):
+        """用一次 progress-change 样本校准时钟，返回 (偏差ms, slew/hold/resync/seek)；锚定时返回 None"""
+        if recv_ns is None:
+            recv_ns = time.monotonic_ns()
+        self._delays.append(delay_ms)
+        extra_delay = delay_ms - min(self._delays)
+        sample_ns = recv_ns - extra_delay * 1e6
+
+        if not self.playing or self._last_sample_ns is None:
+            self._anchor(position, sample_ns)
+            return None
+
+        predicted = self._extrapolate(sample_ns)
+        error = position - predicted
+        dt = (sample_ns - self._last_sample_ns) / 1e6
+        if discontinuity or error > self.SEEK_MS or error < -self.BACK_SEEK_MS:
+            self._anchor(position, sample_ns)
+            return error, "seek"
+        if dt <= 0:
+            self._anchor(position, sample_ns)
+            return error, "resync"
+        if abs(error) > self.SLEW_MS:
+            direction = 1 if error > 0 else -1
+            if self._suspect == direction:
+                self._anchor(position, sample_ns)
+                return error, "resync"
+            self._suspect = direction
+            return error, "hold"
+        else:
+            self._suspect = 0
+
+        # 画面进度从预测值连续过渡，修正量在接下来的 SLEW_PERIOD_MS 内逐步生效
+        self._anchor_pos = predicted
+        self._slew = self.ALPHA * error
+        self._anchor_ns = sample_ns
+        self.rate = min(self.MAX_RATE, max(self.MIN_RATE, self.rate + self.BETA * error / dt))
+        self._last_sample_ns = sample_ns
+        return error, "slew"
+
+    def reset(self):
+        """重新连接后调用：丢弃旧的延迟基线，下一次校准直接重新锚定"""
+        self._delays.clear()
+        self._last_sample_ns = None
+        self._suspect = 0
+
+    def set_playing(self, playing):
+        """处理播放/暂停：暂停时冻结当前进度，恢复时从冻结点重新计时"""
+        if playing == self.playing:
+            return
+        now_ns = time.monotonic_ns()
+        if self.playing:
+            self._anchor_pos = self._extrapolate(now_ns)
+        self._anchor_ns = now_ns
+        self._slew = 0.0
+        self.playing = playing
+        self._last_sample_ns = None
+
+    def _anchor(self, position, sample_ns):
+        self._anchor_pos = float(position)
+        self._anchor_ns = sample_ns
+        self._last_sample_ns = sample_ns
+        self._slew = 0.0
+        self._suspect = 0
+
+
+class LyricTimeline:
+    """歌词时间轴索引：预先把时间轴切成槽位并算好每个槽位显示的主歌词/背景歌词行号"""
+    __slots__ = ("_points", "_main", "_bg")
+
+    def __init__(self, lyrics_db):
+        points = set()
+        for i, line in enumerate(lyrics_db):
+            points.add(line.start)
+            points.add(line.end)
+            if not line.is_bg and i + 1 < len(lyrics_db):
+                points.add(lyrics_db[i + 1].start)
+        self._points = tuple(sorted(points))
+        pos = {p: k for k, p in enumerate(self._points)}
+
+        # 槽位编号：0 = 第一个点之前，2k+1 = 第 k 个点，2k+2 = 第 k 个点之后的间隙
+        main_spans = []
+        bg_spans = []
+        for i, line in enumerate(lyrics_db):
+            start, end = line.start, line.end
+            lo = 2 * pos[start] + 1
+            hi = 2 * pos[end] + 1 if end >= start else -1
+            if line.is_bg:
+                if hi >= lo:
+                    bg_spans.append((lo, hi, i))
+                continue
+            if i + 1 < len(lyrics_db):
+                next_start = lyrics_db[i + 1].start
+                if next_start > start:
+                    # 间隙右端开区间：止于 next_start 之前的那个间隙槽位
+                    hi = max(hi, 2 * pos[next_start])
+            if hi >= lo:
+                main_spans.append((lo, hi, i))
+
+        slot_count = 2 * len(self._points) + 1
+        self._main = self._sweep(main_spans, slot_count)
+        self._bg = self._sweep(bg_spans, slot_count)
+
+    @staticmethod
+    def _sweep(spans, slot_count):
+        """扫描线：对每个槽位求覆盖它的区间中行号最大者（后面的行覆盖前面的行）"""
+        spans.sort()
+        result = [-1] * slot_count
+        heap = []  # (-行号, 结束槽位)，惰性删除已过期区间
+        j = 0
+        for slot in range(slot_count):
+            while j < len(spans) and spans[j][0] == slot:
+                lo, hi, idx = spans[j]
+                heapq.heappush(heap, (-idx, hi))
+                j += 1
+            while heap and heap[0][1] < slot:
+                heapq.heappop(heap)
+            if heap:
+                result[slot] = -heap[0][0]
+        return tuple(result)
+
+    def locate(self, t, hint=-1):
+        """返回时间 t 所在的槽位；hint 为上一次的槽位，顺序播放时可跳过二分查找"""
+        points = self._points
+        if hint >= 0:
+            # 游标快速路径：依次尝试当前槽位、下一个点、下一个间隙
+            for slot in (hint, hint + 1, hint + 2):
+                if slot >= 2 * len(points) + 1:
+                    break
+                k = slot >> 1
+                if slot & 1:
+                    if points[k] == t:
+                        return slot
+                elif (k == 0 or points[k - 1] < t) and (k == len(points) or t < points[k]):
+                    return slot
+        k = bisect.bisect_right(points, t)
+        if k and points[k - 1] == t:
+            return 2 * k - 1
+        return 2 * k
+
+    def next_boundary(self, slot):
+        """槽位之后最近的边界点时间；位于边界点上时返回该点本身（变化即将发生），没有则返回 None"""
+        if slot < 0:
+            return None
+        if slot & 1:
+            return self._points[slot >> 1]
+        k = slot >> 1
+        return self._points[k] if k < len(self._points) else None
+
+    def main_index(self, slot):
+        """槽位对应的主歌词行号，没有则为 -1"""
+        return self._main[slot]
+
+    def bg_index(self, slot):
+        """槽位对应的背景歌词行号，没有则为 -1"""
+        return self._bg[slot]
+
+
+class LyricFrameRenderer:
+    """无窗口逐帧渲染整首歌词（缩略图、回归快照、基准测试、导出视频帧）"""
+    TRANSITION_MS = 300
+
+    def __init__(self, model, width=1200, height=80, config=None, dpr=1.0, image_format=QImage.Format.Format_ARGB32_Premultiplied):
+        self.model = model
+        self.timeline = LyricTimeline(model.lines)
+        self.widget = KaraokeLyricWidget()
+        self.widget.apply_config(config if config is not None else DEFAULT_CONFIG)
+        self.widget.resize(width, height)
+        self.image = QImage(max(1, int(width * dpr)), max(1, int(height * dpr)), image_format)
+        self.image.setDevicePixelRatio(dpr)
+        self.easing = QEasingCurve(QEasingCurve.Type.OutCubic)
+        self.reset()
+
+    def reset(self):
+        """回到歌曲开头之前的状态（没有显示任何行）"""
+        self._slot = -1
+        self._main_idx = -1
+        self._bg_idx = -1
+        self._lines = ()
+        self._old_lines = ()
+        self._switch_time = None  # 最近一次主歌词换行的时刻
+        self._last_time = None
+
+    def _advance(self, current_time):
+        """按窗口 _update_current_line 的规则更新当前显示的行"""
+        slot = self.timeline.locate(current_time, self._slot)
+        self._slot = slot
+        main_idx = self.timeline.main_index(slot)
+        bg_idx = self.timeline.bg_index(slot)
+        if (main_idx < 0 and bg_idx < 0) or (main_idx == self._main_idx and bg_idx == self._bg_idx):
+            return
+        lines = self.model.lines
+        if main_idx >= 0 and bg_idx >= 0:
+            active = (lines[main_idx], lines[bg_idx])
+        else:
+            active = (lines[max(main_idx, bg_idx)],)
+        if main_idx != self._main_idx and self._lines:
+            self._old_lines = self._lines
+            self._switch_time = current_time
+        self._main_idx = main_idx
+        self._bg_idx = bg_idx
+        self._lines = active
+
+    def render(self, current_time, progress=None):
+        """渲染时刻 current_time 的一帧，返回复用的 QImage；progress 为 None 时按换行时刻模拟切换动画"""
+        if self._last_time is not None and current_time < self._last_time:
+            self.reset()  # 向后跳转：从头重新确定显示的行
+        self._last_time = current_time
+        self._advance(current_time)
+        if progress is None:
+            progress = 1.0
+            if self._switch_time is not None:
+                elapsed = current_time - self._switch_time
+                if elapsed < self.TRANSITION_MS:
+                    progress = self.easing.valueForProgress(elapsed / self.TRANSITION_MS)
+        old_lines = self._old_lines if progress < 1.0 else ()
+        return self.widget.render_frame(self._lines, self.model.is_karaoke, current_time, progress,
+                                        old_lines, self.model.is_karaoke, self.image)
+
+    def frames(self, fps=30, start=0, end=None):
+        """按帧率依次渲染 [start, end) 毫秒，逐帧产出 (帧号, 时间ms, QImage)；QImage 每帧复用"""
+        if end is None:
+            end = max((line.end for line in self.model.lines), default=0) + 1000
+        self.reset()
+        step = 1000.0 / fps
+        index = 0
+        t = float(start)
+        while t < end:
+            yield index, int(t), self.render(int(t))
+            index += 1
+            t = start + index * step
+
+
+class PerfMonitor:
+    """可选的性能统计：刷新抖动、绘制、解码、延迟和时钟校准（单位 ms）"""
+    METRICS = ("tick_jitter", "paint", "decode", "latency", "clock_correction")
+    OVERLAY_WINDOW = 200  # 浮层只统计每项最近的若干个样本
+
+    def __init__(self, maxlen=20000):
+        self.start_ns = time.monotonic_ns()
+        self.samples = {name: deque(maxlen=maxlen) for name in self.METRICS}
+        self.tick_due_ns = None  # 下一次刷新的预定时刻
+        self.counter_source = None  # 返回计数字典的函数（消息合并/丢弃等）
+
+    def record(self, name, value, tag=""):
+        self.samples[name].append((time.monotonic_ns(), value, tag))
+
+    @staticmethod
+    def _stats(values):
+        if not values:
+            return {"count": 0}
+        values = sorted(values)
+        n = len(values)
+        return {
+            "count": n,
+            "mean": round(sum(values) / n, 3),
+            "p50": round(values[n // 2], 3),
+            "p95": round(values[min(n - 1, int(n * 0.95))], 3),
+            "p99": round(values[min(n - 1, int(n * 0.99))], 3),
+            "max": round(values[-1], 3),
+        }
+
+    def summary(self, last=None):
+        """各指标的统计摘要；last 指定时只统计最近 last 个样本"""
+        result = {}
+        for name, samples in self.samples.items():
+            items = list(samples)[-last:] if last else list(samples)
+            if name == "tick_jitter":
+                stats = self._stats([abs(v) for _, v, _ in items])
+            else:
+                stats = self._stats([v for _, v, _ in items])
+            if name == "clock_correction":
+                stats["resets"] = sum(1 for _, _, tag in items if tag == "resync")
+                stats["seeks"] = sum(1 for _, _, tag in items if tag == "seek")
+            result[name] = stats
+        return result
+
+    def overlay_text(self):
+        s = self.summary(self.OVERLAY_WINDOW)
+
+        def fmt(name, label):
+            st = s[name]
+            if not st["count"]:
+                return f"{label} -"
+            return f"{label} {st['p50']:.2f}/{st['p99']:.2f}"
+
+        clock = s["clock_correction"]
+        clock_text = f"clk {clock['p50']:+.1f} resync {clock['resets']} seek {clock['seeks']}" if clock["count"] else "clk -"
+        text = "  ".join((
+            fmt("tick_jitter", "tick±"), fmt("paint", "paint"), fmt("decode", "decode"),
+            fmt("latency", "lat"), clock_text,
+        )) + "  (p50/p99 ms)"
+        if self.counter_source is not None:
+            c = self.counter_source()
+            text += f"\ncoalesced {c['progress_coalesced']}/{c['status_coalesced']}  dropped {c['dropped']}"
+            if "topmost_acted" in c:
+                text += f"  top {c['topmost_acted']}/{c['topmost_checks']}/{c['topmost_requests']}"
+        return text
+
+    def dump(self, base_path):
+        """导出统计摘要 (JSON) 和全部原始样本 (CSV)，返回两个文件路径"""
+        json_path = base_path + ".json"
+        csv_path = base_path + ".csv"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "duration_s": round((time.monotonic_ns() - self.start_ns) / 1e9, 3),
+                "metrics": self.summary(),
+                "counters": self.counter_source() if self.counter_source is not None else {},
+            }, f, indent=4, ensure_ascii=False)
+        with open(csv_path, "w", encoding="utf-8") as f:
+            f.write("metric,t_ms,value_ms,tag\n")
+            for name, samples in self.samples.items():
+                for t_ns, value, tag in list(samples):
+                    f.write(f"{name},{(t_ns - self.start_ns) / 1e6:.3f},{value:.4f},{tag}\n")
+        return json_path, csv_path
+
+
+class SyncLog:
+    """时钟校准事件日志 (CSV)，用于对照回放日志评估同步质量"""
+    HEADER = "mono_ms,server_ms,error_ms,kind,rate,delay_ms,duration_ms\n"
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8", buffering=1)
+        self.file.write(self.HEADER)
+
+    def write(self, recv_ns, position, error, kind, rate, delay_ms, duration):
+        self.file.write(f"{recv_ns / 1e6:.3f},{position},{error:.3f},{kind},{rate:.5f},{delay_ms:.3f},{duration}\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ConfigStore(QObject):
+    """配置存储：内存中的配置字典，变化时按键通知，合并后在后台原子写盘"""
+    SAVE_DELAY_MS = 500
+    SAVE_MAX_DELAY_MS = 2000
+    signal_changed = pyqtSignal(object)  # frozenset: 发生变化的键
+
+    def __init__(self, path=CONFIG_FILE, defaults=DEFAULT_CONFIG, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.data = defaults.copy()
+        self.changes = 0  # 产生变化的 update 次数
+        self.saves = 0  # 实际写盘次数
+        self._seq = 0  # 配置版本号，每次变化加一
+        self._saved_seq = 0  # 已写入文件的版本号
+        self._first_pending = None  # 尚未写盘的第一次修改时刻
+        self._pending = LatestValueMailbox()  # (版本号, JSON 文本)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None  # 后台写盘线程，第一次写盘时才启动
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._snapshot)
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.data.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def update(self, values):
+        """合并修改，返回真正变化的键集合；有变化时通知并安排写盘"""
+        data = self.data
+        changed = frozenset(k for k, v in values.items() if k not in data or data[k] != v)
+        if not changed:
+            return changed
+        for key in changed:
+            data[key] = values[key]
+        self._seq += 1
+        self.changes += 1
+        now = time.monotonic()
+        if self._first_pending is None:
+            self._first_pending = now
+        # 防抖：每次修改都推迟写盘，但不超过第一次修改后的 SAVE_MAX_DELAY_MS
+        remaining = self.SAVE_MAX_DELAY_MS - (now - self._first_pending) * 1000
+        self._timer.start(int(max(0, min(self.SAVE_DELAY_MS, remaining))))
+        self.signal_changed.emit(changed)
+        return changed
+
+    def flush(self):
+        """立即（在调用线程中）写入尚未保存的修改，退出前调用"""
+        self._timer.stop()
+        self._first_pending = None
+        if self._seq != self._saved_seq:
+            self._save(self._seq, self._dump())
+
+    def _dump(self):
+        return json.dumps(self.data, indent=4, ensure_ascii=False)
+
+    def _snapshot(self):
+        self._first_pending = None
+        self._pending.put((self._seq, self._dump()))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ConfigStore", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            item = self._pending.take()
+            if item is not None:
+                self._save(*item)
+
+    def _save(self, seq, text):
+        with self._lock:
+            if seq <= self._saved_seq:
+                return  # 已有更新的版本写入（退出时 flush 抢先）
+            tmp = self.path + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"!! 保存配置失败: {e}")
+                return
+            self._saved_seq = seq
+            self.saves += 1
+
+
+class TopMostKeeper(QObject):
+    """窗口置顶服务：只在可能被其他窗口压下时重新置顶（Windows），其他平台交给窗口管理器"""
+    THROTTLE_MS = 50
+    FALLBACK_MS = 2000
+    # Win32 常量
+    HWND_TOPMOST = -1
+    SWP_FLAGS = 0x0001 | 0x0002 | 0x0010  # SWP_NOSIZE | SWP_NOMOVE | SWP_NOACTIVATE
+    GW_HWNDPREV = 3
+    EVENT_SYSTEM_FOREGROUND = 0x0003
+    WINEVENT_OUTOFCONTEXT = 0x0000
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.native = QApplication.platformName() == "windows"
+        self.requests = {}  # 触发原因 -> 次数
+        self.checks = 0  # 实际检查 z 序的次数（合并后）
+        self.acted = 0  # 确实被压住、重新置顶的次数
+        self._last_check = 0.0
+        self._last_foreground = None
+        self._hook = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._check)
+        window.installEventFilter(self)
+        if not self.native:
+            return
+        self._user32 = ctypes.windll.user32
+        self._install_hook()
+        QApplication.instance().applicationStateChanged.connect(self._on_app_state)
+        self._fallback = QTimer(self)
+        self._fallback.timeout.connect(self._on_fallback)
+        self._fallback.start(self.FALLBACK_MS)
+
+    def _install_hook(self):
+        from ctypes import wintypes
+        proc_type = ctypes.WINFUNCTYPE(None, wintypes.HANDLE, wintypes.DWORD, wintypes.HWND,
+                                       wintypes.LONG, wintypes.LONG, wintypes.DWORD, wintypes.DWORD)
+        # 回调对象必须一直持有引用；OUTOFCONTEXT 钩子的回调由本线程的消息循环（即 Qt 事件循环）派发
+        self._hook_proc = proc_type(lambda *args: self.request("foreground"))
+        self._user32.SetWinEventHook.restype = wintypes.HANDLE
+        self._hook = self._user32.SetWinEventHook(self.EVENT_SYSTEM_FOREGROUND, self.EVENT_SYSTEM_FOREGROUND, None,
+                                                  self._hook_proc, 0, 0, self.WINEVENT_OUTOFCONTEXT)
+        if not self._hook:
+            print("!! 无法监听前台窗口切换，只依靠兜底检查置顶")
+
+    def stop(self):
+        if self._hook:
+            self._user32.UnhookWinEvent(self._hook)
+            self._hook = None
+        self._timer.stop()
+
+    def request(self, reason):
+        """某个可能影响 z 序的事件发生了：合并后检查一次"""
+        self.requests[reason] = self.requests.get(reason, 0) + 1
+        if not self.native or self._timer.isActive():
+            return
+        elapsed = (time.monotonic() - self._last_check) * 1000
+        self._timer.start(int(max(0, self.THROTTLE_MS - elapsed)))
+
+    def eventFilter(self, obj, event):
+        kind = event.type()
+        if kind == QEvent.Type.Show:
+            self.request("show")
+        elif kind == QEvent.Type.WindowDeactivate:
+            self.request("deactivate")
+        return False
+
+    def _on_app_state(self, state):
+        if state != Qt.ApplicationState.ApplicationActive:
+            self.request("app_inactive")
+
+    def _on_fallback(self):
+        foreground = self._user32.GetForegroundWindow()
+        if foreground != self._last_foreground:
+            self.request("fallback")
+
+    def _check(self):
+        self._last_check = time.monotonic()
+        if not self.window.isVisible():
+            return
+        self.checks += 1
+        user32 = self._user32
+        self._last_foreground = user32.GetForegroundWindow()
+        hwnd = int(self.window.winId())
+        # 上方只有不可见窗口时已经在最顶层，不需要动
+        above = user32.GetWindow(hwnd, self.GW_HWNDPREV)
+        while above and not user32.IsWindowVisible(above):
+            above = user32.GetWindow(above, self.GW_HWNDPREV)
+        if above:
+            user32.SetWindowPos(hwnd, self.HWND_TOPMOST, 0, 0, 0, 0, self.SWP_FLAGS)
+            self.acted += 1
+
+    def counters(self):
+        return {
+            "topmost_requests": sum(self.requests.values()),
+            "topmost_checks": self.checks,
+            "topmost_acted": self.acted,
+        }
+
+
+class DesktopLyricWindow(QWidget):
+    def __init__(self, ws_url=WS_URL):
         super().__init__()
+        self.lyric_model = None  # 当前歌曲的歌词模型
         self.lyrics_db = []
+        self.timeline = LyricTimeline([])  # 歌词时间轴索引
+        self.timeline_slot = -1  # 上一次查找到的槽位（顺序播放游标）
         self.current_idx = -1
+        self.current_bg_idx = -1
         self.is_karaoke_mode = False  # 是否为卡拉OK模式
-        self.current_time = 0  # 当前播放时间
+        self.current_time = 0  # 当前播放时间（每次刷新时从时钟模型读取）
+        self.clock = PlaybackClock()  # 播放进度时钟模型
         self.last_server_time = 0  # 上次从服务器收到的时间
+        self.song_duration = 0  # 进度消息中的歌曲时长，变化时视为跳转
+        self.sync_counts = {"slew": 0, "hold": 0, "resync": 0, "seek": 0}  # 各种时钟修正的次数
+        self.sync_log = None  # 时钟校准事件日志（SyncLog），配置了路径才创建
         self.is_playing = True  # 是否正在播放
-        
-        # 卡拉OK刷新定时器 (50ms = 20fps)
+        self.connection_state = "connecting"  # 与 SPlayer 的连接状态
+        self.perf = None  # 性能统计（PerfMonitor），启用后才创建
+        self.perf_label = None  # 性能统计浮层
+        self.layout_precomputer = LayoutPrecomputer()  # 后台整首歌预排版
+        self._first_frame_callbacks = []  # 第一帧画出后再执行的启动工作
+        self.layout_precomputer.signal_done.connect(self._on_layouts_ready)
+        
+        # 自适应刷新定时器：单次触发，每次根据时间轴计算下一次画面变化的时刻
+        # 逐字填充时按屏幕刷新率刷新，间隙/暂停/隐藏时完全休眠
         self.karaoke_timer = QTimer()
-        self.karaoke_timer.setInterval(50)
+        self.karaoke_timer.setSingleShot(True)
+        self.karaoke_timer.setTimerType(Qt.TimerType.PreciseTimer)
         self.karaoke_timer.timeout.connect(self._on_karaoke_tick)
         
         self.init_config()
         self.init_ui()
-        
-        self.worker = WebSocketWorker()
+        if self.config.get("sync_log"):
+            self.set_sync_log(self.config["sync_log"])
+        
+        self.worker = WebSocketWorker(ws_url)
+        self.worker.prefer_karaoke = self.prefer_karaoke
+        cache_dir = self.config.get("lyric_cache_dir", "lyric_cache")
+        if cache_dir:
+            self.worker.cache = LyricCache(cache_dir, int(self.config.get("lyric_cache_max_mb", 32) * 1024 * 1024))
         self.worker.signal_lyric_data.connect(self.handle_lyrics_update)
-        self.worker.signal_progress.connect(self.handle_progress_update)
+        self.worker.signal_progress_ready.connect(self._take_progress)
         self.worker.signal_song_info.connect(self.handle_song_change)
-        self.worker.signal_status.connect(self.handle_status_change)
+        self.worker.signal_status_ready.connect(self._take_status)
+        self.worker.signal_connection.connect(self.handle_connection_change)
+        if self.config.get("capture_path"):
+            self.set_capture(self.config["capture_path"])
         self.worker.start()
 
-        # 强力置顶定时器
-        self.keep_top_timer = QTimer(self)
-        self.keep_top_timer.timeout.connect(self._enforce_top_most)
-        self.keep_top_timer.start(100)  # 每100ms强制置顶一次
+        # 置顶：只在可能被其他窗口压住时检查（窗口已在 init_ui 中显示，先检查一次）
+        # 要在性能浮层之前创建：浮层显示时会立即读取置顶计数
+        self.top_most = TopMostKeeper(self)
+        self.top_most.request("show")
+
+        if self.config.get("perf_overlay", False):
+            self.set_perf_overlay(True)
 
     def init_ui(self):
         # 1. 窗口属性
@@ -349,36 +2462,39 @@ class DesktopLyricWindow(QWidget):
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
 
     def init_config(self):
-        """加载配置"""
-        self.config = DEFAULT_CONFIG.copy()
-        try:
-            with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-                saved = json.load(f)
-                self.config.update(saved)
-        except:
-            pass
+        """加载配置；之后的修改都通过 config_store.update() 进行，由 _on_config_changed 应用"""
+        self.config_store = ConfigStore(CONFIG_FILE, parent=self)
+        self.config = self.config_store.data
+        self.config_store.signal_changed.connect(self._on_config_changed)
             
         # 应用配置
         self.main_font_size = self.config.get("main_font_size", 24)
         self.trans_font_size = self.config.get("trans_font_size", 13)
         self.window_width = self.config.get("window_width", 1200)
+        self.prefer_karaoke = self.config.get("prefer_karaoke", True)
 
     def save_config(self):
-        """保存配置"""
-        # 更新当前配置字典
-        self.config["main_font_size"] = self.main_font_size
-        self.config["trans_font_size"] = self.trans_font_size
-        self.config["window_width"] = self.lyric_widget.width()
-        self.config["font_family"] = self.lyric_widget.font_family
-        self.config["bg_font_size"] = self.lyric_widget.bg_font_size
-        self.config["main_size_no_bg"] = self.lyric_widget.main_size_no_bg
-        self.config["main_size_with_bg"] = self.lyric_widget.main_size_with_bg
-        
-        try:
-            with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.config, f, indent=4, ensure_ascii=False)
-        except Exception as e:
-            print(f"保存配置失败: {e}")
+        """立即保存尚未写盘的配置修改（平时由 ConfigStore 合并后在后台写入）"""
+        self.config_store.flush()
+
+    def _on_config_changed(self, changed):
+        """配置变化通知：只应用真正变化的项"""
+        config = self.config
+        if not changed.isdisjoint(KaraokeLyricWidget.CONFIG_KEYS):
+            self.main_font_size = config["main_font_size"]
+            self.trans_font_size = config["trans_font_size"]
+            self.lyric_widget.apply_config(config, changed)
+            if not changed.isdisjoint(KaraokeLyricWidget.LAYOUT_KEYS):
+                self._precompute_layouts()
+            self._schedule_next_frame()
+        if "window_width" in changed:
+            self.window_width = config["window_width"]
+            self.lyric_widget.setFixedWidth(self.window_width)
+            self.resize(self.window_width + 20, self.height())
+        if "prefer_karaoke" in changed and config["prefer_karaoke"] != self.prefer_karaoke:
+            self.set_prefer_karaoke(config["prefer_karaoke"])
+        if "perf_overlay" in changed:
+            self.set_perf_overlay(config["perf_overlay"])
 
     def init_ui(self):
         # 1. 窗口属性
@@ -401,16 +2517,9 @@ class DesktopLyricWindow(QWidget):
         
         # 3. 使用自定义歌词组件（支持动画）
         self.lyric_widget = KaraokeLyricWidget()
-        self.lyric_widget.main_font_size = self.main_font_size
-        self.lyric_widget.trans_font_size = self.trans_font_size
+        self.lyric_widget.apply_config(self.config)
         self.lyric_widget.setFixedWidth(self.window_width)
         
-        # 应用配置中的额外属性
-        self.lyric_widget.bg_font_size = self.config.get("bg_font_size", 14)
-        self.lyric_widget.main_size_no_bg = self.config.get("main_size_no_bg", 24)
-        self.lyric_widget.main_size_with_bg = self.config.get("main_size_with_bg", 17)
-        self.lyric_widget.font_family = self.config.get("font_family", "Microsoft YaHei UI")
-        
         layout.addWidget(self.lyric_widget)
         self.setLayout(layout)
 
@@ -426,162 +2535,207 @@ class DesktopLyricWindow(QWidget):
         self.show()
         self.activateWindow()
 
-    def _enforce_top_most(self):
-        """使用 Windows API 强制置顶"""
-        hwnd = self.winId()
-        try:
-            # HWND_TOPMOST = -1
-            # SWP_NOMOVE = 0x0002
-            # SWP_NOSIZE = 0x0001
-            # SWP_NOACTIVATE = 0x0010
-            ctypes.windll.user32.SetWindowPos(int(hwnd), -1, 0, 0, 0, 0, 0x0001 | 0x0002 | 0x0010)
-            self.raise_()  # 同时调用 Qt 的 raise
-        except Exception:
-            pass
-
     def update_text_ui(self, line_data, current_time=None, animate=False):
         """更新歌词显示，支持卡拉OK模式"""
-        if self.is_karaoke_mode and "words" in line_data:
+        if self.is_karaoke_mode and line_data.words:
             # 卡拉OK模式：设置逐字数据
             if animate:
                 # 切换歌词行时播放动画
-                self.lyric_widget.set_lyrics(
-                    line_data["words"], 
-                    line_data["trans"], 
-                    True, 
-                    animate=True
-                )
+                self.lyric_widget.set_multi_lines([line_data], True, animate=True)
             else:
                 # 只更新时间（逐字填充动画）
-                self.lyric_widget.words = line_data["words"]
-                self.lyric_widget.trans = line_data["trans"]
+                self.lyric_widget.words = line_data.words
+                self.lyric_widget.trans = line_data.trans
                 self.lyric_widget.is_karaoke_mode = True
                 if current_time is not None:
                     self.lyric_widget.set_time(current_time)
         else:
             # 普通模式
-            text = line_data["original"]
-            if line_data["trans"]:
-                text += f"  ({line_data['trans']})"
+            text = line_data.original
+            if line_data.trans:
+                text += f"  ({line_data.trans})"
             self.lyric_widget.set_plain_text(text, animate=animate)
 
-    def handle_lyrics_update(self, lrc_data, is_karaoke):
-        """处理歌词数据更新"""
-        self.is_karaoke_mode = is_karaoke
-        parsed = []
-        for line in lrc_data:
-            words_list = line.get("words", [])
-            orig = "".join([w.get("word", "") for w in words_list])
-            trans = line.get("translatedLyric", "")
-            # 简单清洗
-            if orig.strip():
-                entry = {
-                    "start": line.get("startTime", 0),
-                    "end": line.get("endTime", 0),
-                    "original": orig,
-                    "trans": trans,
-                    "isBG": line.get("isBG", False),      # 是否为背景歌词
-                    "isDuet": line.get("isDuet", False)   # 是否为对唱
-                }
-                # 如果是卡拉OK模式，保存逐字信息
-                if is_karaoke:
-                    entry["words"] = words_list
-                parsed.append(entry)
-        self.lyrics_db = parsed
+    def handle_lyrics_update(self, model):
+        """处理歌词数据更新（解析已在工作线程完成）"""
+        self.lyric_model = model
+        self.is_karaoke_mode = model.is_karaoke
+        self.lyrics_db = model.lines
+        self.timeline = model.timeline  # 预计算的时间轴索引
+        self.timeline_slot = -1
         self.current_idx = -1  # 重置索引
-        # 启动或停止卡拉OK定时器
-        if is_karaoke and not self.karaoke_timer.isActive():
-            self.karaoke_timer.start()
-        elif not is_karaoke and self.karaoke_timer.isActive():
-            self.karaoke_timer.stop()
+        self.current_bg_idx = -1
+        self._precompute_layouts()
+        # 立即刷新一次，之后由调度器决定下一帧
+        self._schedule_next_frame(0)
+
+    def _precompute_layouts(self):
+        """在后台为当前歌曲的所有行按当前字体设置预排版"""
+        model = self.lyric_model
+        if model is None or not model.lines or not self.config.get("precompute_layouts", True):
+            return
+        cache = self.worker.cache if self.config.get("persist_layout_metrics", True) else None
+        self.layout_precomputer.submit(model, self.lyric_widget.font_family, self.lyric_widget.layout_specs(), cache)
 
-    def handle_progress_update(self, current_time):
+    def _on_layouts_ready(self, model, layouts):
+        if model is self.lyric_model:  # 已经切歌的结果直接丢弃
+            self.lyric_widget.install_layouts(layouts)
+
+    def set_prefer_karaoke(self, enabled):
+        """切换逐字/普通歌词；另一种歌词在首次切换时才解码"""
+        self.prefer_karaoke = enabled
+        self.worker.prefer_karaoke = enabled
+        model = self.lyric_model
+        if model is not None and model.is_karaoke != enabled:
+            other = model.alternate()
+            if other is not None:
+                self.handle_lyrics_update(other)
+
+    def _take_progress(self):
+        """从邮箱取出最新进度（积压期间的旧进度已被合并）"""
+        progress = self.worker.progress_box.take()
+        if progress is not None:
+            self.handle_progress_update(*progress)
+
+    def _take_status(self):
+        is_playing = self.worker.status_box.take()
+        if is_playing is not None:
+            self.handle_status_change(is_playing)
+
+    def handle_progress_update(self, current_time, duration=0, delay_ms=0.0, recv_ns=None):
+        if self.is_playing and not self.clock.playing:
+            # 重连后的第一条进度：恢复时钟（随后的 sync 会直接重新锚定）
+            self.clock.set_playing(True)
+        recv_ns = int(recv_ns) if recv_ns else time.monotonic_ns()
+        # 时长变化（切歌/重新加载）时进度必然不连续
+        discontinuity = bool(duration and self.song_duration and duration != self.song_duration)
+        if duration:
+            self.song_duration = duration
+        # 用服务器进度校准时钟模型：小偏差平滑修正，跳转立即重新锚定
+        correction = self.clock.sync(current_time, delay_ms, recv_ns, discontinuity)
+        perf = self.perf
+        seek = False
+        if correction is not None:
+            error, kind = correction
+            self.sync_counts[kind] += 1
+            if self.sync_log is not None:
+                self.sync_log.write(recv_ns, current_time, error, kind, self.clock.rate, delay_ms, duration)
+            if perf is not None:
+                perf.record("clock_correction", error, kind)
+            if kind == "seek":
+                seek = True
+                print(f">> 检测到跳转: {(current_time - error) / 1000:.1f}s -> {current_time / 1000:.1f}s")
         if not self.lyrics_db:
             return
-        
-        # 同步服务器时间 (仅当偏差超过阈值时才强制同步，避免抖动)
-        if abs(self.current_time - current_time) > 200:
-            self.current_time = current_time
+        self.current_time = self.clock.position()
 
-        # 查找并更新当前行索引
-        self._update_current_line(self.current_time)
+        # 查找并更新当前行索引（跳转后重新二分定位，且不播放切换动画）
+        self._update_current_line(self.current_time, seek)
+        if perf is not None:
+            # 服务器时间戳 -> 本地接收 -> 界面按该进度刷新完成
+            perf.record("latency", delay_ms + (time.monotonic_ns() - recv_ns) / 1e6)
+        self._schedule_next_frame()
     
     def _on_karaoke_tick(self):
-        """定时器回调：高频刷新卡拉OK歌词"""
-        if not self.is_karaoke_mode or not self.lyrics_db:
+        """定时器回调：刷新歌词并安排下一帧"""
+        if not self.lyrics_db:
             return
         
-        # 如果暂停了，不进行时间插值
-        if not self.is_playing:
+        # 如果暂停了（或连接断开时钟被冻结），不进行时间插值
+        if not self.is_playing or not self.clock.playing:
             return
         
-        # 本地插值：每次 tick 增加 50ms
-        self.current_time += 50
+        perf = self.perf
+        if perf is not None and perf.tick_due_ns is not None:
+            perf.record("tick_jitter", (time.monotonic_ns() - perf.tick_due_ns) / 1e6)
+            perf.tick_due_ns = None
+
+        # 从时钟模型读取精确进度，不再依赖定时器按时触发
+        self.current_time = self.clock.position()
         
         # 使用统一的多行更新逻辑
         self._update_current_line(self.current_time)
+        self._schedule_next_frame()
+
+    def _frame_interval(self):
+        """屏幕刷新间隔 (ms)"""
+        screen = self.screen()
+        rate = screen.refreshRate() if screen else 0
+        return 1000.0 / rate if rate > 0 else 1000.0 / 60
+
+    def _schedule_next_frame(self, delay=None):
+        """根据时间轴计算下一次画面变化的时刻，只在需要时唤醒定时器"""
+        self.karaoke_timer.stop()
+        if not self.lyrics_db or not self.is_playing or not self.clock.playing or not self.isVisible():
+            return
+        
+        if delay is None:
+            frame_ms = self._frame_interval()
+            # 下一次换行的时刻
+            next_time = self.timeline.next_boundary(self.timeline_slot)
+            if next_time is not None:
+                delay = next_time - self.current_time
+            # 当前行内的下一次变化（正在填充的像素步长或下一个字开始）
+            widget_delay = self.lyric_widget.next_change_delay(self.current_time, frame_ms)
+            if widget_delay is not None and (delay is None or widget_delay < delay):
+                delay = widget_delay
+            if delay is None:
+                return  # 后面没有任何变化，等待服务器进度唤醒
+            # 正好位于边界点上时 next_boundary 返回的就是当前时刻：至少等 1ms 到点后的状态，避免 start(0) 空转
+            delay = max(delay / max(self.clock.rate, 0.01), 1)
+        interval = max(1, int(delay)) if delay > 0 else 0
+        self.karaoke_timer.start(interval)
+        if self.perf is not None:
+            self.perf.tick_due_ns = time.monotonic_ns() + interval * 1000000
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._schedule_next_frame(0)
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.karaoke_timer.stop()
     
-    def _update_current_line(self, current_time):
-        """更新当前歌词行索引并刷新显示（限制一行主歌词+一行背景歌词）"""
-        # 查找与当前时间重叠的歌词行（新歌词替换旧歌词）
-        main_line = None
-        bg_line = None
-        main_idx = -1
-        
-        for i, line in enumerate(self.lyrics_db):
-            is_bg = line.get("isBG", False)
-            
-            # 检查时间是否在范围内（后面的歌词会覆盖前面的）
-            if line["start"] <= current_time <= line["end"]:
-                if is_bg:
-                    bg_line = line  # 新的背景歌词替换旧的
-                else:
-                    main_line = line  # 新的主歌词替换旧的
-                    main_idx = i
-            # 也检查间隙时间（显示上一行直到下一行开始）
-            elif not is_bg and i + 1 < len(self.lyrics_db):
-                if line["start"] <= current_time < self.lyrics_db[i+1]["start"]:
-                    main_line = line
-                    main_idx = i
-        
-        # 构建显示列表：最多1行主歌词 + 1行背景歌词
-        active_lines = []
-        if main_line:
-            active_lines.append(main_line)
-        if bg_line:
-            active_lines.append(bg_line)
-        
-        # 更新显示
-        if active_lines:
-            if main_idx != self.current_idx:
-                # 切换到新行，播放动画
-                self.current_idx = main_idx
-                self._update_multi_lines(active_lines, current_time, animate=True)
-            else:
-                # 同一行，只更新时间（用于逐字高亮）
-                self._update_multi_lines(active_lines, current_time, animate=False)
-    
-    def _update_multi_lines(self, lines, current_time, animate=False):
-        """更新多行歌词显示"""
-        # 构建多行数据
-        line_data = []
-        for line in lines:
-            entry = {
-                "words": line.get("words", []),
-                "trans": line.get("trans", ""),
-                "isBG": line.get("isBG", False),
-                "isDuet": line.get("isDuet", False)
-            }
-            # 如果没有 words，用 original 生成
-            if not entry["words"]:
-                entry["words"] = [{"word": line.get("original", ""), "startTime": line["start"], "endTime": line["end"]}]
-            line_data.append(entry)
+    def _update_current_line(self, current_time, seek=False):
+        """更新当前歌词行索引并刷新显示（限制一行主歌词+一行背景歌词）；seek 表示进度发生了跳转"""
+        # 通过时间轴索引查找与当前时间重叠的歌词行（新歌词替换旧歌词）
+        slot = self.timeline.locate(current_time, -1 if seek else self.timeline_slot)
+        self.timeline_slot = slot
+        main_idx = self.timeline.main_index(slot)
+        bg_idx = self.timeline.bg_index(slot)
+        if main_idx < 0 and bg_idx < 0:
+            if not seek or current_time >= self.lyrics_db[0].start:
+                return
+            # 跳回第一句之前（如重新播放）：显示第一句，而不是停留在跳转前的行
+            main_idx = 0
+        
+        if main_idx == self.current_idx and bg_idx == self.current_bg_idx:
+            # 同一组行，只更新时间（用于逐字高亮），不分配任何新对象
+            self.lyric_widget.set_time(current_time)
+            return
         
+        # 构建显示列表：最多1行主歌词 + 1行背景歌词（直接引用歌词模型中的行）
+        if main_idx >= 0 and bg_idx >= 0:
+            active_lines = (self.lyrics_db[main_idx], self.lyrics_db[bg_idx])
+        else:
+            active_lines = (self.lyrics_db[max(main_idx, bg_idx)],)
+        
+        # 切换到新主歌词行时播放动画，仅背景歌词变化或跳转时直接替换
+        animate = main_idx != self.current_idx and not seek
+        self.current_idx = main_idx
+        self.current_bg_idx = bg_idx
+        self._update_multi_lines(active_lines, current_time, animate=animate, seek=seek)
+    
+    def _update_multi_lines(self, lines, current_time, animate=False, seek=False):
+        """更新多行歌词显示（直接使用歌词模型中的行）"""
         if animate:
-            self.lyric_widget.set_multi_lines(line_data, self.is_karaoke_mode, animate=True)
+            self.lyric_widget.set_multi_lines(lines, self.is_karaoke_mode, animate=True)
+        elif seek:
+            # 跳转：中止正在进行的切换动画并清掉旧行
+            self.lyric_widget.set_multi_lines(lines, self.is_karaoke_mode, animate=False)
         else:
             # 只更新时间，不播放动画
-            self.lyric_widget.lines = line_data
+            self.lyric_widget.lines = lines
             
         # 始终更新时间，确保动画第一帧也是准确的
         self.lyric_widget.set_time(current_time)
@@ -593,8 +2747,21 @@ class DesktopLyricWindow(QWidget):
     def handle_status_change(self, is_playing):
         """处理播放/暂停状态变化"""
         self.is_playing = is_playing
+        self.clock.set_playing(is_playing)
+        self._schedule_next_frame(0)
         print(f">> 播放状态: {'播放' if is_playing else '暂停'}")
 
+    def handle_connection_change(self, state):
+        """处理与 SPlayer 的连接状态变化：断开时冻结进度，重连后等待新的进度重新同步"""
+        previous = self.connection_state
+        self.connection_state = state
+        if state == "disconnected" and previous == "connected":
+            print(">> 与 SPlayer 的连接已断开，正在重连...")
+            self.clock.set_playing(False)
+            self.karaoke_timer.stop()
+        elif state == "connected":
+            self.clock.reset()
+
     # --- 鼠标拖拽逻辑 ---
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -618,19 +2785,11 @@ class DesktopLyricWindow(QWidget):
             # 步长：向上滚动(+120)字号变大，向下(-120)变小
             step = 2 if delta > 0 else -2
             
-            self.main_font_size += step
-            self.trans_font_size += step
-            
-            # 限制最小字号，防止太小看不见
-            self.main_font_size = max(10, self.main_font_size)
-            self.trans_font_size = max(8, self.trans_font_size)
-            
-            # 同步到歌词组件
-            self.lyric_widget.main_font_size = self.main_font_size
-            self.lyric_widget.trans_font_size = self.trans_font_size
-            
-            # 刷新 UI
-            self.lyric_widget.update()
+            # 限制最小字号，防止太小看不见；由配置变化通知同步到歌词组件并刷新
+            self.config_store.update({
+                "main_font_size": max(10, self.main_font_size + step),
+                "trans_font_size": max(8, self.trans_font_size + step),
+            })
             
             event.accept()
         else:
@@ -657,6 +2816,10 @@ class DesktopLyricWindow(QWidget):
             elif key == Qt.Key.Key_D:
                 self.move(pos.x() + step, pos.y())
                 event.accept()
+            elif key == Qt.Key.Key_P:
+                # Alt+P 切换性能统计浮层
+                self.config_store.update({"perf_overlay": self.perf_label is None or not self.perf_label.isVisible()})
+                event.accept()
             else:
                 super().keyPressEvent(event)
         else:
@@ -673,19 +2836,114 @@ class DesktopLyricWindow(QWidget):
         self.setStyleSheet("background-color: rgba(0, 0, 0, 1);")
         super().leaveEvent(event)
         
+    def enable_perf(self):
+        """开始记录性能统计（之后一直记录到退出）"""
+        if self.perf is None:
+            self.perf = PerfMonitor()
+            self.perf.counter_source = self.counters
+            self.worker.perf = self.perf
+            self.lyric_widget.perf = self.perf
+        return self.perf
+
+    def counters(self):
+        """消息合并/丢弃与置顶计数"""
+        counters = self.worker.counters()
+        counters.update(self.top_most.counters())
+        return counters
+
+    def set_perf_overlay(self, visible):
+        """显示/隐藏性能统计浮层；显示时自动开始记录"""
+        if visible:
+            self.enable_perf()
+            if self.perf_label is None:
+                self.perf_label = QLabel(self)
+                self.perf_label.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+                self.perf_label.setStyleSheet(
+                    "background-color: rgba(0, 0, 0, 160); color: #7CFC00; font: 9pt Consolas; padding: 1px 4px;")
+                self.perf_timer = QTimer(self)
+                self.perf_timer.timeout.connect(self._refresh_perf_overlay)
+            self._refresh_perf_overlay()
+            self.perf_label.show()
+            self.perf_label.raise_()
+            self.perf_timer.start(500)
+        elif self.perf_label is not None:
+            self.perf_label.hide()
+            self.perf_timer.stop()
+
+    def _refresh_perf_overlay(self):
+        self.perf_label.setText(self.perf.overlay_text())
+        self.perf_label.adjustSize()
+        self.perf_label.move(10, 0)
+
+    def dump_perf(self):
+        """退出时导出性能统计（未启用时不做任何事）"""
+        if self.perf is None:
+            return
+        try:
+            json_path, csv_path = self.perf.dump(self.config.get("perf_dump", "lyric_perf"))
+            print(f">> 性能统计已导出: {json_path}, {csv_path}")
+        except Exception as e:
+            print(f"导出性能统计失败: {e}")
+
+    def call_after_first_frame(self, callback):
+        """歌词第一帧画出后（下一轮事件循环）再调用 callback，用于推迟不影响首屏的启动工作"""
+        self._first_frame_callbacks.append(callback)
+        if len(self._first_frame_callbacks) == 1:
+            self.lyric_widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if obj is self.lyric_widget and event.type() == QEvent.Type.Paint:
+            obj.removeEventFilter(self)
+            QTimer.singleShot(0, self._run_first_frame_callbacks)
+        return super().eventFilter(obj, event)
+
+    def _run_first_frame_callbacks(self):
+        callbacks, self._first_frame_callbacks = self._first_frame_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def set_sync_log(self, path):
+        """开始把时钟校准事件写入 CSV（path 为空则停止记录）"""
+        if self.sync_log is not None:
+            self.sync_log.close()
+            self.sync_log = None
+        if path:
+            try:
+                self.sync_log = SyncLog(path)
+                print(f">> 时钟校准日志: {os.path.abspath(path)}")
+            except OSError as e:
+                print(f"!! 无法写入时钟校准日志: {e}")
+
+    def set_capture(self, path):
+        """开始把收到的原始消息录制到 path（path 为空则停止录制）"""
+        capture = self.worker.capture
+        if capture is not None:
+            self.worker.capture = None
+            capture.close()
+            print(f">> 录制结束: {capture.written} 条消息，丢弃 {capture.dropped} 条，轮转 {capture.rotations} 次")
+        if path:
+            try:
+                self.worker.capture = CaptureLogger(path, int(self.config.get("capture_max_mb", 64) * 1024 * 1024),
+                                                    int(self.config.get("capture_backups", 5)), self.worker.url)
+                print(f">> 录制原始消息: {os.path.abspath(path)}")
+            except (OSError, ImportError) as e:
+                print(f"!! 无法录制原始消息: {e}")
+
     def refresh_ui(self):
         """强制刷新当前显示的歌词，用于应用新的字体设置"""
         # 同步字体大小到歌词组件
         self.lyric_widget.main_font_size = self.main_font_size
         self.lyric_widget.trans_font_size = self.trans_font_size
-        self.lyric_widget.update()
+        self.lyric_widget.invalidate_layout()
+        self._precompute_layouts()
 
-from PyQt6.QtWidgets import QPushButton, QSpinBox, QVBoxLayout, QGroupBox, QFormLayout, QLineEdit
+from PyQt6.QtWidgets import QPushButton, QSpinBox, QVBoxLayout, QGroupBox, QFormLayout, QLineEdit, QCheckBox, QComboBox
 
 class ControlPanelWindow(QWidget):
-    def __init__(self, lyric_window):
+    def __init__(self, lyric_window, hide_on_close=True):
         super().__init__()
         self.lyric_win = lyric_window
+        self.hide_on_close = hide_on_close  # 没有托盘图标时关闭改为最小化，否则再也打不开
         self.init_ui()
         
     def init_ui(self):
@@ -746,7 +3004,14 @@ class ControlPanelWindow(QWidget):
         self.spin_width.setValue(self.lyric_win.lyric_widget.width())
         self.spin_width.valueChanged.connect(self.on_width_change)
         
+        self.combo_overflow = QComboBox()
+        for label, mode in (("跟随演唱滚动", "scroll"), ("缩小字号", "fit"), ("不处理", "none")):
+            self.combo_overflow.addItem(label, mode)
+        self.combo_overflow.setCurrentIndex(max(0, self.combo_overflow.findData(self.lyric_win.lyric_widget.overflow_mode)))
+        self.combo_overflow.currentIndexChanged.connect(self.on_overflow_change)
+        
         form_width.addRow("最大宽度:", self.spin_width)
+        form_width.addRow("超长歌词:", self.combo_overflow)
         grp_width.setLayout(form_width)
         
         # --- 分组3：位置设置 ---
@@ -771,12 +3036,22 @@ class ControlPanelWindow(QWidget):
         grp_action = QGroupBox("操作")
         vbox_action = QVBoxLayout()
         
+        self.chk_karaoke = QCheckBox("逐字歌词 (卡拉OK)")
+        self.chk_karaoke.setChecked(self.lyric_win.prefer_karaoke)
+        self.chk_karaoke.toggled.connect(self.on_karaoke_toggle)
+
+        self.chk_perf = QCheckBox("性能统计浮层 (Alt+P)")
+        self.chk_perf.setChecked(self.lyric_win.perf_label is not None and self.lyric_win.perf_label.isVisible())
+        self.chk_perf.toggled.connect(self.on_perf_toggle)
+        
         btn_refresh = QPushButton("强制刷新歌词")
         btn_refresh.clicked.connect(self.on_refresh_click)
 
         self.btn_exit = QPushButton("结束程序")
         self.btn_exit.clicked.connect(QApplication.instance().quit)
         
+        vbox_action.addWidget(self.chk_karaoke)
+        vbox_action.addWidget(self.chk_perf)
         vbox_action.addWidget(btn_refresh)
         vbox_action.addWidget(self.btn_exit)
         grp_action.setLayout(vbox_action)
@@ -786,34 +3061,76 @@ class ControlPanelWindow(QWidget):
         layout.addWidget(grp_pos)
         layout.addWidget(grp_action)
         self.setLayout(layout)
+
+        # 快捷键（Alt+滚轮等）或其他途径改了配置时同步控件，避免下次编辑用旧值覆盖
+        self.spin_keys = {
+            "main_font_size": self.spin_main,
+            "trans_font_size": self.spin_trans,
+            "main_size_no_bg": self.spin_size_no_bg,
+            "main_size_with_bg": self.spin_size_with_bg,
+            "bg_font_size": self.spin_bg_size,
+            "window_width": self.spin_width,
+        }
+        self.lyric_win.config_store.signal_changed.connect(self._on_config_changed)
         self.show()
+
+    def _on_config_changed(self, changed):
+        """配置变化通知：更新受影响的控件，期间屏蔽控件信号，不再回写配置"""
+        config = self.lyric_win.config
+        for key, spin in self.spin_keys.items():
+            if key in changed:
+                spin.blockSignals(True)
+                spin.setValue(config[key])
+                spin.blockSignals(False)
+        if "font_family" in changed:
+            self.edit_font_family.blockSignals(True)
+            self.edit_font_family.setText(config["font_family"])
+            self.edit_font_family.blockSignals(False)
+        if "overflow_mode" in changed:
+            self.combo_overflow.blockSignals(True)
+            self.combo_overflow.setCurrentIndex(max(0, self.combo_overflow.findData(config["overflow_mode"])))
+            self.combo_overflow.blockSignals(False)
+        if "prefer_karaoke" in changed:
+            self.chk_karaoke.blockSignals(True)
+            self.chk_karaoke.setChecked(config["prefer_karaoke"])
+            self.chk_karaoke.blockSignals(False)
+        if "perf_overlay" in changed:
+            # Alt+P 切换浮层时同步复选框
+            self.chk_perf.blockSignals(True)
+            self.chk_perf.setChecked(config["perf_overlay"])
+            self.chk_perf.blockSignals(False)
         
     def on_font_family_change(self):
         new_font = self.edit_font_family.text().strip()
         if new_font:
-            self.lyric_win.lyric_widget.font_family = new_font
-            self.lyric_win.refresh_ui()
-            self.lyric_win.save_config()
+            self.lyric_win.config_store.update({"font_family": new_font})
     
+    # 以下修改都只写入配置存储：由窗口的配置变化通知应用，写盘合并后在后台进行
     def on_font_change(self):
-        self.lyric_win.main_font_size = self.spin_main.value()
-        self.lyric_win.trans_font_size = self.spin_trans.value()
-        self.lyric_win.refresh_ui()
-        self.lyric_win.save_config()
+        self.lyric_win.config_store.update({
+            "main_font_size": self.spin_main.value(),
+            "trans_font_size": self.spin_trans.value(),
+        })
     
     def on_dynamic_size_change(self):
-        self.lyric_win.lyric_widget.main_size_no_bg = self.spin_size_no_bg.value()
-        self.lyric_win.lyric_widget.main_size_with_bg = self.spin_size_with_bg.value()
-        self.lyric_win.lyric_widget.bg_font_size = self.spin_bg_size.value()
-        self.lyric_win.refresh_ui()
-        self.lyric_win.save_config()
+        self.lyric_win.config_store.update({
+            "main_size_no_bg": self.spin_size_no_bg.value(),
+            "main_size_with_bg": self.spin_size_with_bg.value(),
+            "bg_font_size": self.spin_bg_size.value(),
+        })
         
     def on_width_change(self):
-        new_width = self.spin_width.value()
-        self.lyric_win.lyric_widget.setFixedWidth(new_width)
-        self.lyric_win.resize(new_width + 20, self.lyric_win.height())
-        self.lyric_win.save_config()
+        self.lyric_win.config_store.update({"window_width": self.spin_width.value()})
+        
+    def on_overflow_change(self):
+        self.lyric_win.config_store.update({"overflow_mode": self.combo_overflow.currentData()})
         
+    def on_karaoke_toggle(self, checked):
+        self.lyric_win.config_store.update({"prefer_karaoke": checked})
+        
+    def on_perf_toggle(self, checked):
+        self.lyric_win.config_store.update({"perf_overlay": checked})
+
     def on_refresh_click(self):
         self.lyric_win.refresh_ui()
         
@@ -834,9 +3151,76 @@ class ControlPanelWindow(QWidget):
         self.lyric_win.move(x, y)
 
     def closeEvent(self, event):
-        # 拦截关闭事件，改为隐藏
+        if not event.spontaneous():
+            # QApplication.quit() 会先关闭所有窗口，拒绝关闭会让退出被取消
+            event.accept()
+            return
+        # 拦截用户的关闭操作，改为隐藏（没有托盘时最小化）
         event.ignore()
-        self.hide()
+        if self.hide_on_close:
+            self.hide()
+        else:
+            self.showMinimized()
+
+
+class StartupProfiler(QObject):
+    """--startup-profile：记录第一帧画出、首次连上 SPlayer 的时刻，打印启动报告并写入 JSON"""
+    CONNECT_WAIT_MS = 3000
+
+    def __init__(self, window, path="startup_profile.json", exit_after=False):
+        super().__init__(window)
+        self.window = window
+        self.path = path
+        self.exit_after = exit_after
+        self.first_frame = False
+        self.connected = False
+        self.reported = False
+        window.call_after_first_frame(self._on_first_frame)
+        window.worker.signal_connection.connect(self._on_connection)
+
+    def _on_first_frame(self):
+        startup_mark("第一帧画出")
+        self.first_frame = True
+        if self.connected:
+            self.report()
+        else:
+            QTimer.singleShot(self.CONNECT_WAIT_MS, self.report)
+
+    def _on_connection(self, state):
+        if state == "connected" and not self.connected:
+            startup_mark("连接成功")
+            self.connected = True
+            if self.first_frame:
+                self.report()
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        t0 = STARTUP_MARKS[0][1]
+        marks = sorted(STARTUP_MARKS, key=lambda m: m[1])
+        print(">> 启动耗时（相对开始导入）:")
+        for name, t, cost in marks:
+            cost_text = f"  (耗时 {cost * 1000:.1f} ms)" if cost is not None else ""
+            print(f"   {(t - t0) * 1000:8.1f} ms  {name}{cost_text}")
+        if self.path:
+            try:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump({"marks": [
+                        {"name": name, "at_ms": round((t - t0) * 1000, 3),
+                         "cost_ms": round(cost * 1000, 3) if cost is not None else None}
+                        for name, t, cost in marks
+                    ]}, f, indent=4, ensure_ascii=False)
+            except OSError as e:
+                print(f"!! 无法写入启动报告: {e}")
+        if self.exit_after:
+            self.window.worker.stop()
+            self.window.set_capture(None)
+            QApplication.instance().quit()
+
+
+_t = startup_mark("模块加载完成", _t)
+
 
 if __name__ == "__main__":
     # 隐藏控制台窗口
@@ -846,25 +3230,41 @@ if __name__ == "__main__":
         pass
 
     app = QApplication(sys.argv)
+    _t = startup_mark("创建 QApplication", _t)
     
-    # 1. 创建歌词窗口
+    # 1. 创建歌词窗口（显示窗口并启动连接，其余部分等第一帧之后再准备）
     lyric_win = DesktopLyricWindow()
+    _t = startup_mark("创建歌词窗口、启动连接", _t)
+    if "--startup-profile" in sys.argv:
+        startup_profiler = StartupProfiler(lyric_win, exit_after="--exit-after-startup" in sys.argv)
+    if "--perf" in sys.argv:
+        # 只记录不显示浮层，退出时导出
+        lyric_win.enable_perf()
+    if "--sync-log" in sys.argv[:-1]:
+        lyric_win.set_sync_log(sys.argv[sys.argv.index("--sync-log") + 1])
+    if "--capture" in sys.argv[:-1]:
+        lyric_win.set_capture(sys.argv[sys.argv.index("--capture") + 1])
     
-    # 2. 创建控制面板，并传入歌词窗口实例
-    panel_win = ControlPanelWindow(lyric_win)
+    # 2. 控制面板：第一次从托盘打开时才创建（桌面没有系统托盘时启动后直接显示）
+    panel_win = None
     
-    # 3. 系统托盘图标
-    tray_icon = QSystemTrayIcon(app)
-    # 使用系统标准图标
-    tray_icon.setIcon(app.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon))
-    
-    # 托盘菜单
-    tray_menu = QMenu()
-    
-    action_show_panel = QAction("控制面板", app)
-    action_show_panel.triggered.connect(panel_win.show)
+    def show_panel():
+        global panel_win
+        if panel_win is None:
+            panel_win = ControlPanelWindow(lyric_win, QSystemTrayIcon.isSystemTrayAvailable())  # 创建时即显示
+            # 绑定控制面板的退出按钮也走 clean_exit
+            panel_win.btn_exit.clicked.disconnect()
+            panel_win.btn_exit.clicked.connect(clean_exit)
+        else:
+            panel_win.showNormal()  # 也从最小化恢复
+        panel_win.activateWindow()
     
     def clean_exit():
+        lyric_win.dump_perf()
+        lyric_win.set_sync_log(None)
+        lyric_win.set_capture(None)
+        lyric_win.save_config()
+        lyric_win.top_most.stop()
         try:
             lyric_win.worker.stop()
         except:
@@ -873,26 +3273,44 @@ if __name__ == "__main__":
         # 强制结束进程
         os._exit(0)
     
-    action_exit = QAction("退出", app)
-    action_exit.triggered.connect(clean_exit)
-    
-    tray_menu.addAction(action_show_panel)
-    tray_menu.addSeparator()
-    tray_menu.addAction(action_exit)
-    
-    # 绑定控制面板的退出按钮也走 clean_exit
-    panel_win.btn_exit.clicked.disconnect()
-    panel_win.btn_exit.clicked.connect(clean_exit)
-    
-    tray_icon.setContextMenu(tray_menu)
+    # 3. 系统托盘图标（第一帧画出之后再创建）
+    def setup_tray():
+        global tray_icon, tray_menu
+        started = time.perf_counter()
+        if not QSystemTrayIcon.isSystemTrayAvailable():
+            # 没有托盘就无法打开控制面板和退出：直接显示控制面板
+            print(">> 系统托盘不可用，直接显示控制面板")
+            show_panel()
+            startup_mark("控制面板就绪（无托盘）", started)
+            return
+        tray_icon = QSystemTrayIcon(app)
+        # 使用系统标准图标
+        tray_icon.setIcon(app.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon))
+        
+        # 托盘菜单
+        tray_menu = QMenu()
+        
+        action_show_panel = QAction("控制面板", app)
+        action_show_panel.triggered.connect(show_panel)
+        
+        action_exit = QAction("退出", app)
+        action_exit.triggered.connect(clean_exit)
+        
+        tray_menu.addAction(action_show_panel)
+        tray_menu.addSeparator()
+        tray_menu.addAction(action_exit)
+        
+        tray_icon.setContextMenu(tray_menu)
+        
+        # 双击托盘图标显示控制面板
+        def on_tray_activated(reason):
+            if reason == QSystemTrayIcon.ActivationReason.DoubleClick:
+                show_panel()
+                
+        tray_icon.activated.connect(on_tray_activated)
+        tray_icon.show()
+        startup_mark("托盘图标就绪", started)
     
-    # 双击托盘图标显示控制面板
-    def on_tray_activated(reason):
-        if reason == QSystemTrayIcon.ActivationReason.DoubleClick:
-            panel_win.show()
-            panel_win.activateWindow()
-            
-    tray_icon.activated.connect(on_tray_activated)
-    tray_icon.show()
+    lyric_win.call_after_first_frame(setup_tray)
     
-    sys.exit(app.exec())
\ No newline at end of file
+    sys.exit(app.exec())
@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# 无界面运行（必须在导入 PyQt6 之前设置）
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtGui import QImage
+
+from desktop_lyrics import DEFAULT_CONFIG, LyricFrameRenderer, LyricModel, MessageDecoder
+from replay_ws import load_messages
+
+# ================= 配置区域 =================
+LOG_FILE = "ws_received_data.txt"
+FPS = 30
+WIDTH = 1200
+HEIGHT = 80
+# ===========================================
+
+
+def load_model(path=LOG_FILE, prefer_karaoke=True):
+    """取录制日志中最后一条 lyric-change 消息，解析为歌词模型"""
+    lyric_raw = None
+    for ts, raw in load_messages(path):
+        if raw.startswith('{"type":"lyric-change"'):
+            lyric_raw = raw
+    if lyric_raw is None:
+        raise SystemExit(f"!! 日志中没有 lyric-change 消息: {path}")
+    return LyricModel.from_payload(MessageDecoder().decode(lyric_raw)[1], prefer_karaoke)
+
+
+def load_config(path=None):
+    config = DEFAULT_CONFIG.copy()
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            config.update(json.load(f))
+    return config
+
+
+def write_png_sequence(renderer, out_dir, fps, start, end, quality=-1):
+    """整首歌渲染为 PNG 序列 out_dir/frame_000000.png ..."""
+    os.makedirs(out_dir, exist_ok=True)
+    count = 0
+    for index, t, image in renderer.frames(fps, start, end):
+        image.save(os.path.join(out_dir, f"frame_{index:06d}.png"), "PNG", quality)
+        count += 1
+    return count
+
+
+def write_rgba_stream(renderer, stream, fps, start, end):
+    """整首歌渲染为原始 RGBA 帧流（预乘 alpha，逐帧紧密排列，可直接交给 ffmpeg -f rawvideo -pix_fmt rgba）"""
+    count = 0
+    for index, t, image in renderer.frames(fps, start, end):
+        bits = image.constBits()
+        bits.setsize(image.sizeInBytes())
+        stream.write(bits)
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无界面渲染歌词帧（单帧快照 / 整首歌 PNG 序列 / 原始 RGBA 流）")
+    parser.add_argument("--log", default=LOG_FILE, help="取歌词消息的录制日志")
+    parser.add_argument("--config", help="配置 JSON（默认使用内置默认配置）")
+    parser.add_argument("--plain", action="store_true", help="使用普通歌词而不是逐字歌词")
+    parser.add_argument("--width", type=int, default=WIDTH)
+    parser.add_argument("--height", type=int, default=HEIGHT)
+    parser.add_argument("--dpr", type=float, default=1.0, help="设备像素比（2 表示按两倍分辨率渲染）")
+    parser.add_argument("--at", type=int, help="只渲染该时刻 (ms) 的一帧，输出到 --out 指定的 PNG")
+    parser.add_argument("--progress", type=float, help="配合 --at 强制指定切换动画进度 0~1")
+    parser.add_argument("--fps", type=float, default=FPS)
+    parser.add_argument("--start", type=int, default=0, help="开始时间 (ms)")
+    parser.add_argument("--end", type=int, help="结束时间 (ms)，默认最后一行结束后 1 秒")
+    parser.add_argument("--format", choices=("png", "rgba"), default="png")
+    parser.add_argument("--png-quality", type=int, default=-1, help="PNG 压缩质量 0~100（越大压缩越少、越快）")
+    parser.add_argument("--out", default="frames", help="PNG 目录 / RGBA 输出文件（- 表示标准输出） / --at 的 PNG 路径")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    model = load_model(args.log, not args.plain)
+    image_format = QImage.Format.Format_RGBA8888_Premultiplied if args.format == "rgba" else QImage.Format.Format_ARGB32_Premultiplied
+    renderer = LyricFrameRenderer(model, args.width, args.height, load_config(args.config), args.dpr, image_format)
+
+    if args.at is not None:
+        renderer.render(args.at, args.progress).save(args.out)
+        print(f">> 已保存 {args.at} ms 的画面: {args.out}", file=sys.stderr)
+        return 0
+
+    started = time.perf_counter()
+    if args.format == "png":
+        count = write_png_sequence(renderer, args.out, args.fps, args.start, args.end, args.png_quality)
+    elif args.out == "-":
+        count = write_rgba_stream(renderer, sys.stdout.buffer, args.fps, args.start, args.end)
+    else:
+        with open(args.out, "wb") as f:
+            count = write_rgba_stream(renderer, f, args.fps, args.start, args.end)
+    elapsed = time.perf_counter() - started
+    print(f">> 渲染 {count} 帧 ({renderer.image.width()}x{renderer.image.height()}, {args.fps} fps)，"
+          f"耗时 {elapsed:.2f}s，{count / max(elapsed, 1e-9):.1f} 帧/秒", file=sys.stderr)
+    app.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
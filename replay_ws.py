@@ -0,0 +1,268 @@
+import argparse
+import base64
+import hashlib
+import os
+import re
+import socket
+import struct
+import sys
+import threading
+import time
+
+# ================= 配置区域 =================
+# 默认回放 debug_ws_log.py 录制的日志，并在 SPlayer 的默认地址上提供服务
+LOG_FILE = "ws_received_data.txt"
+HOST = "127.0.0.1"
+PORT = 25885
+# 回放时两条消息之间的最大间隔（秒），避免多次录制之间的长时间空档
+MAX_GAP = 5.0
+# ===========================================
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_TIMESTAMP_RE = re.compile(r'"timestamp":(\d+)')
+
+
+def is_capture(path):
+    """是否为 CaptureLogger 录制的 NDJSON 文件（.ndjson / .ndjson.gz / .ndjson.zst）"""
+    return ".ndjson" in os.path.basename(path)
+
+
+def load_messages(path=LOG_FILE, all_sessions=False):
+    """
+    读取录制的日志，返回 [(时间ms, 原始消息), ...]
+
+    - CaptureLogger 录制的 NDJSON：默认只取最近一次录制（含它轮转出的文件），all_sessions 时按顺序接上更早的录制；
+      时间取本地接收时的单调时钟，还原客户端实际收到的节奏
+    - 旧版文本日志：时间优先取消息 data 中的 timestamp（毫秒），没有时退回到【时间】行（秒级精度）
+    """
+    if is_capture(path):
+        from desktop_lyrics import CaptureLogger
+        return [(record["mono_ms"], record["raw"]) for record in CaptureLogger.read(path, all_sessions)]
+    messages = []
+    wall_ms = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("【时间】: "):
+                try:
+                    wall_ms = time.mktime(time.strptime(line[6:].strip(), "%Y-%m-%d %H:%M:%S")) * 1000
+                except ValueError:
+                    pass
+            elif line.startswith("【内容】: "):
+                raw = line[6:].rstrip("\n")
+                match = _TIMESTAMP_RE.search(raw, max(0, len(raw) - 64))
+                messages.append((int(match.group(1)) if match else wall_ms, raw))
+    return messages
+
+
+def schedule(messages, speed=1.0, max_gap=MAX_GAP):
+    """把录制时间换算成回放时的相对发送时刻（秒）；speed<=0 表示不等待"""
+    result = []
+    offset = 0.0
+    prev = None
+    for ts, raw in messages:
+        if prev is not None and speed > 0:
+            offset += min(max(ts - prev, 0) / 1000.0, max_gap) / speed
+        prev = ts
+        result.append((offset, raw))
+    return result
+
+
+def restamp(raw):
+    """把消息中的服务器时间戳改为当前时间，模拟实时推送"""
+    now = str(int(time.time() * 1000))
+    return _TIMESTAMP_RE.sub('"timestamp":' + now, raw)
+
+
+class ReplayServer(threading.Thread):
+    """
+    本地替身 SPlayer WebSocket 服务：客户端连上后按原始节奏回放录制的消息
+
+    只用标准库实现了 RFC 6455 的握手和文本帧发送，足够喂给 websocket-client
+    """
+
+    def __init__(self, messages, host=HOST, port=PORT, speed=1.0, max_gap=MAX_GAP, keep_timestamps=False, loop=False):
+        super().__init__(daemon=True)
+        self.plan = schedule(messages, speed, max_gap)
+        self.keep_timestamps = keep_timestamps
+        self.loop = loop
+        self.sent = 0
+        self.finished = threading.Event()
+        self.sock = socket.create_server((host, port))
+        self.sock.settimeout(0.5)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    conn, _ = self.sock.accept()
+                except socket.timeout:
+                    continue
+                with conn:
+                    if self._handshake(conn):
+                        self._replay(conn)
+                if not self.loop:
+                    break
+        except OSError as e:
+            print(f"!! 回放服务出错: {e}")
+        finally:
+            self.sock.close()
+            self.finished.set()
+
+    def _handshake(self, conn):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return False
+            request += chunk
+        match = re.search(rb"Sec-WebSocket-Key:\s*(\S+)", request, re.IGNORECASE)
+        if not match:
+            return False
+        accept = base64.b64encode(hashlib.sha1(match.group(1) + WS_GUID.encode()).digest())
+        conn.sendall(
+            b"HTTP/1.1 101 Switching Protocols\r\n"
+            b"Upgrade: websocket\r\n"
+            b"Connection: Upgrade\r\n"
+            b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+        )
+        return True
+
+    def _replay(self, conn):
+        send_lock = threading.Lock()
+        reader = threading.Thread(target=self._read_client, args=(conn, send_lock), daemon=True)
+        reader.start()
+        start = time.monotonic()
+        for offset, raw in self.plan:
+            delay = start + offset - time.monotonic()
+            if delay > 0 and self._stop_event.wait(delay):
+                break
+            if not self.keep_timestamps:
+                raw = restamp(raw)
+            try:
+                with send_lock:
+                    conn.sendall(self._frame(0x1, raw.encode("utf-8")))
+            except OSError:
+                return
+            self.sent += 1
+        try:
+            with send_lock:
+                conn.sendall(self._frame(0x8, struct.pack("!H", 1000)))
+        except OSError:
+            pass
+
+    def _read_client(self, conn, send_lock):
+        """读取客户端帧：回应 ping（客户端的心跳检测），其余忽略"""
+        try:
+            while True:
+                head = self._recv_exact(conn, 2)
+                opcode = head[0] & 0x0F
+                length = head[1] & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", self._recv_exact(conn, 2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", self._recv_exact(conn, 8))[0]
+                mask = self._recv_exact(conn, 4) if head[1] & 0x80 else b"\0\0\0\0"
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(self._recv_exact(conn, length)))
+                if opcode == 0x9:
+                    with send_lock:
+                        conn.sendall(self._frame(0xA, payload))
+                elif opcode == 0x8:
+                    return
+        except OSError:
+            pass
+
+    @staticmethod
+    def _recv_exact(conn, size):
+        data = b""
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("客户端已断开")
+            data += chunk
+        return data
+
+    @staticmethod
+    def _frame(opcode, payload):
+        """服务端到客户端的帧不加掩码"""
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        return header + payload
+
+
+def run_app(server, linger=1.0, perf=False, sync_log=None, url=None):
+    """在同一进程中启动歌词窗口，由真实的 WebSocketWorker 连接替身服务（url 默认为 SPlayer 的默认地址）"""
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QTimer
+    import desktop_lyrics
+
+    app = QApplication(sys.argv)
+    lyric_win = desktop_lyrics.DesktopLyricWindow(url or desktop_lyrics.WS_URL)
+    if perf:
+        lyric_win.set_perf_overlay(True)
+    if sync_log:
+        lyric_win.set_sync_log(sync_log)
+
+    def check_done():
+        if server.finished.is_set():
+            QTimer.singleShot(int(linger * 1000), app.quit)
+        else:
+            QTimer.singleShot(100, check_done)
+
+    check_done()
+    app.exec()
+    lyric_win.worker.stop()
+    lyric_win.dump_perf()
+    lyric_win.set_sync_log(None)
+    print(f">> 回放结束：发送 {server.sent} 条消息，歌词 {len(lyric_win.lyrics_db)} 行，"
+          f"最后进度 {lyric_win.current_time} ms，当前行 {lyric_win.current_idx}，时钟修正 {lyric_win.sync_counts}")
+    return lyric_win
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放录制的 SPlayer WebSocket 消息")
+    parser.add_argument("--log", default=LOG_FILE, help="录制日志路径")
+    parser.add_argument("--all-sessions", action="store_true", help="NDJSON 录制：连同更早几次录制的轮转文件一起回放")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示不等待")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP, help="两条消息之间的最大间隔（秒）")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--keep-timestamps", action="store_true", help="保留原始时间戳，不改写为当前时间")
+    parser.add_argument("--serve-only", action="store_true", help="只启动替身服务，由外部程序连接")
+    parser.add_argument("--loop", action="store_true", help="每次有客户端连接都从头回放（仅 --serve-only）")
+    parser.add_argument("--headless", action="store_true", help="无界面运行 (QT_QPA_PLATFORM=offscreen)")
+    parser.add_argument("--perf", action="store_true", help="显示性能统计浮层，结束时导出 JSON/CSV")
+    parser.add_argument("--sync-log", help="把时钟校准事件写入该 CSV，用于评估同步质量")
+    args = parser.parse_args(argv)
+
+    messages = load_messages(args.log, args.all_sessions)
+    print(f">> 读取 {len(messages)} 条消息: {os.path.abspath(args.log)}")
+    server = ReplayServer(messages, args.host, args.port, args.speed, args.max_gap,
+                          args.keep_timestamps, args.loop and args.serve_only)
+    server.start()
+    print(f">> 替身服务: ws://{args.host}:{args.port}  倍速: {args.speed}")
+
+    if args.serve_only:
+        try:
+            while not server.finished.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            print("\n用户手动停止")
+            server.stop()
+        return
+
+    if args.headless:
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    run_app(server, perf=args.perf, sync_log=args.sync_log, url=f"ws://{args.host}:{args.port}")
+
+
+if __name__ == "__main__":
+    main()